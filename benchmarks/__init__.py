@@ -0,0 +1 @@
+"""Benchmarks for the wildfire cost pipeline (see bench_pipeline.py)."""
@@ -0,0 +1,244 @@
+# benchmarks/bench_pipeline.py
+"""
+Benchmark the wildfire cost pipeline stage by stage.
+
+Stages (each timed independently on the same synthetic input):
+  - generate:          synthetic ledger columns (tools.iter_mock_cost_chunks)
+  - to_records:        columns -> list of record dicts (tool input shape)
+  - aggregate_loop:    dict-loop aggregation
+  - aggregate_records: aggregate_costs engine selection (loop or columnar)
+  - aggregate_columns: columnar NumPy aggregation
+  - aggregate_parallel: columnar aggregation across --workers processes
+                       (shared-memory columns; skipped with --workers 1)
+  - load_ledger:       stream a CSV ledger from disk and aggregate it
+  - compact:           top-N compaction of a high-cardinality aggregation
+  - render:            markdown table + insights rendering
+  - decode_json:       JSON string of aggregated rows -> rows (tool input)
+
+Usage (from the repository root):
+
+    python -m benchmarks.bench_pipeline --sizes 1e3,1e4,1e5,1e6 \
+        --output bench.json
+    python -m benchmarks.bench_pipeline --sizes 1e8 --max-record-rows 0 \
+        --max-ledger-rows 0
+    python -m benchmarks.bench_pipeline --compare bench.json
+
+Results are JSON (one entry per stage and size with wall seconds and
+peak traced allocation) so runs can be diffed with --compare.
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from wildfire_agent import main_agent
+from wildfire_agent.columnar import aggregate_column_batches, aggregate_columns
+from wildfire_agent.jsonio import decode_rows, dumps
+from wildfire_agent.ledger import iter_ledger_chunks
+from wildfire_agent.parallel import aggregate_columns_parallel
+from wildfire_agent.render import render_cost_table
+from wildfire_agent.tools import mock_columns_to_records
+
+from .synthetic import chunk_to_columns, synthetic_aggregated, synthetic_chunk, synthetic_columns
+
+
+def _measure(
+    stage: str,
+    rows: int,
+    fn: Callable[[], Any],
+    repeat: int,
+    memory: bool,
+) -> Dict[str, Any]:
+    """Best-of-`repeat` wall time, plus peak traced allocation of one extra run."""
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+
+    peak_bytes: Optional[int] = None
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        base, _ = tracemalloc.get_traced_memory()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        peak_bytes = peak - base
+
+    result = {
+        "stage": stage,
+        "rows": rows,
+        "seconds": min(times),
+        "rows_per_second": rows / min(times) if min(times) > 0 else None,
+        "peak_bytes": peak_bytes,
+    }
+    logging.info(
+        "%-18s rows=%-11d %.4fs peak=%s",
+        stage,
+        rows,
+        result["seconds"],
+        "-" if peak_bytes is None else f"{peak_bytes / 1e6:.1f}MB",
+    )
+    return result
+
+
+def run_size(n_rows: int, opts: argparse.Namespace) -> List[Dict[str, Any]]:
+    """Run every applicable stage for one ledger size."""
+    measure = lambda stage, rows, fn: _measure(stage, rows, fn, opts.repeat, opts.memory)
+    results = []
+
+    results.append(measure("generate", n_rows, lambda: synthetic_columns(n_rows, opts.seed)))
+    chunk = synthetic_chunk(n_rows, opts.seed)
+    columns = chunk_to_columns(chunk)
+
+    if n_rows <= opts.max_record_rows:
+        results.append(measure("to_records", n_rows, lambda: mock_columns_to_records(chunk)))
+        records = mock_columns_to_records(chunk)
+        results.append(
+            measure("aggregate_loop", n_rows, lambda: main_agent._aggregate_records_loop(records))
+        )
+        results.append(
+            measure("aggregate_records", n_rows, lambda: main_agent._aggregate_records(records))
+        )
+        del records
+
+    results.append(measure("aggregate_columns", n_rows, lambda: aggregate_columns(columns)))
+    if opts.workers > 1:
+        results.append(
+            measure(
+                "aggregate_parallel",
+                n_rows,
+                lambda: aggregate_columns_parallel(columns, opts.workers, min_rows=0),
+            )
+        )
+
+    if n_rows <= opts.max_ledger_rows:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "ledger.csv")
+            pd.DataFrame(
+                {
+                    "region": np.asarray(columns.regions)[columns.region_codes],
+                    "category": np.asarray(columns.categories)[columns.category_codes],
+                    "cost": columns.cost,
+                    "hours": columns.hours,
+                    "year": 2024,
+                }
+            ).to_csv(path, index=False)
+            results.append(
+                measure(
+                    "load_ledger",
+                    n_rows,
+                    lambda: aggregate_column_batches(iter_ledger_chunks(path)),
+                )
+            )
+
+    n_groups = min(n_rows, opts.max_groups)
+    aggregated = synthetic_aggregated(n_groups, opts.seed)
+    results.append(measure("compact", n_groups, lambda: main_agent._compact_rows(aggregated, 6)))
+    results.append(measure("render", n_groups, lambda: render_cost_table(aggregated)))
+    payload = dumps(aggregated)
+    results.append(
+        measure("decode_json", n_groups, lambda: decode_rows(payload, max_bytes=len(payload) * 4))
+    )
+    return results
+
+
+def compare(
+    results: List[Dict[str, Any]],
+    baseline_path: str,
+    threshold: float,
+) -> int:
+    """Print per-stage ratios against a baseline file; return regression count."""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {
+            (r["stage"], r["rows"]): r for r in json.load(f)["results"]
+        }
+
+    regressions = 0
+    print(f"{'stage':<18} {'rows':>11} {'base (s)':>10} {'new (s)':>10} {'ratio':>7}")
+    for r in results:
+        old = baseline.get((r["stage"], r["rows"]))
+        if old is None or not old["seconds"]:
+            continue
+        ratio = r["seconds"] / old["seconds"]
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(
+            f"{r['stage']:<18} {r['rows']:>11} {old['seconds']:>10.4f} "
+            f"{r['seconds']:>10.4f} {ratio:>7.2f}{flag}"
+        )
+    return regressions
+
+
+def _parse_sizes(text: str) -> List[int]:
+    return [int(float(s)) for s in text.split(",") if s.strip()]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", default="1e3,1e4,1e5,1e6", type=_parse_sizes,
+                        help="Comma-separated ledger sizes (default: 1e3,1e4,1e5,1e6).")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per stage (best is kept).")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-memory", dest="memory", action="store_false",
+                        help="Skip the traced peak-memory run of each stage.")
+    parser.add_argument("--max-record-rows", type=int, default=1_000_000,
+                        help="Largest size for list-of-dict stages.")
+    parser.add_argument("--max-ledger-rows", type=int, default=1_000_000,
+                        help="Largest size for the on-disk ledger stage.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Worker processes for the aggregate_parallel stage.")
+    parser.add_argument("--max-groups", type=int, default=100_000,
+                        help="Aggregated rows used for compact/render stages.")
+    parser.add_argument("--output", help="Write JSON results to this file.")
+    parser.add_argument("--compare", metavar="BASELINE",
+                        help="Compare against a previous JSON results file.")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Slowdown ratio above 1 flagged as regression (default 0.2).")
+    opts = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    logging.getLogger("wildfire_cost_agent").setLevel(logging.WARNING)
+
+    results: List[Dict[str, Any]] = []
+    for n_rows in opts.sizes:
+        results.extend(run_size(n_rows, opts))
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }
+    if opts.output:
+        with open(opts.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        logging.info("Wrote %d results to %s", len(results), opts.output)
+
+    if opts.compare:
+        return 1 if compare(results, opts.compare, opts.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,64 @@
+# benchmarks/synthetic.py
+"""
+Synthetic wildfire cost ledgers at benchmark scale.
+
+Ledger rows come from the agent's own mock generator,
+``wildfire_agent.tools.iter_mock_cost_chunks`` (region, year, fire_id,
+category, cost, hours, with the same base costs, noise and aircraft
+hours), so benchmarks measure the data the tools actually produce.
+Generation is vectorized so 10^8-row column sets are cheap.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List
+
+import numpy as np
+
+from wildfire_agent.columnar import CODE_DTYPE, CostColumns
+from wildfire_agent.tools import CATEGORIES, REGIONS, iter_mock_cost_chunks
+
+
+def synthetic_chunk(n_rows: int, seed: int = 42) -> Dict[str, Any]:
+    """
+    The first `n_rows` mock rows for 2024 as one ``iter_mock_cost_chunks``
+    column chunk, with as many fires per region x category as needed.
+    """
+    n_fires = max(-(-n_rows // (len(REGIONS) * len(CATEGORIES))), 1)
+    return next(iter_mock_cost_chunks(n_fires=n_fires, seed=seed, chunk_rows=max(n_rows, 1)))
+
+
+def chunk_to_columns(chunk: Dict[str, Any]) -> CostColumns:
+    """Convert a mock column chunk to a ``CostColumns`` batch."""
+    return CostColumns(
+        chunk["region_code"].astype(CODE_DTYPE),
+        chunk["category_code"].astype(CODE_DTYPE),
+        chunk["cost"],
+        chunk["hours"],
+        list(chunk["regions"]),
+        list(chunk["categories"]),
+    )
+
+
+def synthetic_columns(n_rows: int, seed: int = 42) -> CostColumns:
+    """Generate `n_rows` synthetic ledger lines as a ``CostColumns`` batch."""
+    return chunk_to_columns(synthetic_chunk(n_rows, seed))
+
+
+def synthetic_aggregated(n_groups: int, seed: int = 42) -> List[Dict[str, Any]]:
+    """
+    Aggregated rows for a high-cardinality grouping (e.g. fire × crew),
+    used to exercise compaction and rendering at scale.
+    """
+    rng = np.random.default_rng(seed)
+    total_cost = rng.uniform(1_000, 500_000, size=n_groups)
+    hours = rng.uniform(0, 200, size=n_groups)
+    return [
+        {
+            "region": REGIONS[i % len(REGIONS)],
+            "category": f"{CATEGORIES[i % len(CATEGORIES)]}-{i}",
+            "total_cost": c,
+            "hours": h,
+        }
+        for i, (c, h) in enumerate(zip(total_cost.tolist(), hours.tolist()))
+    ]
@@ -0,0 +1,47 @@
+# tests/test_cube.py
+"""
+Filters on the cost cube and on summarize_costs' raw records.
+
+A filter value may come as a list or, as models often send it, a single
+value; both must select the same rows.
+"""
+
+from __future__ import annotations
+
+import pytest
+
+from wildfire_agent.cube import CostCube, normalize_filters
+from wildfire_agent.main_agent import _filter_records
+
+RECORDS = [
+    {"region": "North", "category": "aircraft", "year": 2024, "cost": 100.0, "hours": 1.0},
+    {"region": "North", "category": "personnel", "year": 2024, "cost": 50.0, "hours": 2.0},
+    {"region": "South", "category": "aircraft", "year": 2024, "cost": 70.0, "hours": 3.0},
+    {"region": "N", "category": "aircraft", "year": 2024, "cost": 5.0, "hours": 4.0},
+]
+
+
+@pytest.mark.parametrize(
+    "filters, expected",
+    [
+        ({"region": "North"}, {"region": ["North"]}),
+        ({"region": ["North", "South"]}, {"region": ["North", "South"]}),
+        ({"year": 2024}, {"year": [2024]}),
+        ({"region": "", "category": None, "year": []}, {}),
+        (None, {}),
+    ],
+)
+def test_normalize_filters(filters, expected):
+    assert normalize_filters(filters) == expected
+
+
+@pytest.mark.parametrize("region", ["North", ["North"]])
+def test_single_value_filter_matches_whole_label(region):
+    records = _filter_records(RECORDS, {"region": region})
+    assert [r["cost"] for r in records] == [100.0, 50.0]
+
+    rows = CostCube.from_records(RECORDS).query(["category"], {"region": region})
+    assert [(r["region"], r["category"], r["total_cost"]) for r in rows] == [
+        ("North", "aircraft", 100.0),
+        ("North", "personnel", 50.0),
+    ]
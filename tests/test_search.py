@@ -0,0 +1,293 @@
+# tests/test_search.py
+"""
+AsyncSearchClient against a local stub Custom Search server.
+
+The stub answers on 127.0.0.1 and the client is pointed at it with
+``endpoint=``, so no request leaves the machine.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import httpx
+import pytest
+
+from wildfire_agent.search import AsyncSearchClient, SearchCache, normalize_query
+
+
+class StubSearchServer:
+    """
+    Threaded stub of the Custom Search endpoint.
+
+    Each query returns one item titled after it. Queries containing
+    "fail" get HTTP 500, queries containing "empty" get no items, and
+    every request waits `delay` seconds so concurrency can be observed.
+    """
+
+    def __init__(self, delay: float = 0.0) -> None:
+        self.delay = delay
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:  # noqa: N802 - http.server API
+                params = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+                with stub._lock:
+                    stub.requests.append(params)
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                try:
+                    time.sleep(stub.delay)
+                    query = params.get("q", "")
+                    if "fail" in query:
+                        status, payload = 500, {"error": {"message": "backend error"}}
+                    elif "empty" in query:
+                        status, payload = 200, {}
+                    else:
+                        status, payload = 200, {
+                            "items": [{"title": f"Result for {query}", "snippet": "s", "link": "l"}]
+                        }
+                    body = json.dumps(payload).encode("utf-8")
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                finally:
+                    with stub._lock:
+                        stub.in_flight -= 1
+
+            def log_message(self, format: str, *args) -> None:
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self.endpoint = f"http://127.0.0.1:{self.server.server_address[1]}/customsearch/v1"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub():
+    server = StubSearchServer()
+    yield server
+    server.close()
+
+
+def make_client(stub: StubSearchServer, **kwargs) -> AsyncSearchClient:
+    return AsyncSearchClient("test-key", "test-cx", endpoint=stub.endpoint, **kwargs)
+
+
+def test_search_sends_credentials_and_returns_items(stub):
+    client = make_client(stub)
+
+    async def run():
+        try:
+            return await client.search("aircraft costs", num=3)
+        finally:
+            await client.aclose()
+
+    items = asyncio.run(run())
+
+    assert items == [{"title": "Result for aircraft costs", "snippet": "s", "link": "l"}]
+    assert stub.requests == [
+        {"key": "test-key", "cx": "test-cx", "q": "aircraft costs", "num": "3", "safe": "off"}
+    ]
+
+
+def test_http_error_does_not_leak_api_key(stub):
+    client = make_client(stub)
+
+    async def run():
+        try:
+            await client.search("fail please")
+        finally:
+            await client.aclose()
+
+    with pytest.raises(httpx.HTTPStatusError) as excinfo:
+        asyncio.run(run())
+    assert "500" in str(excinfo.value)
+    assert "test-key" not in str(excinfo.value)
+
+
+def test_search_many_keeps_order_and_returns_errors(stub):
+    client = make_client(stub)
+
+    async def run():
+        try:
+            return await client.search_many(["one", "fail two", "empty three"])
+        finally:
+            await client.aclose()
+
+    first, second, third = asyncio.run(run())
+
+    assert first[0]["title"] == "Result for one"
+    assert isinstance(second, httpx.HTTPStatusError)
+    assert third == []
+
+
+def test_search_many_respects_max_concurrency():
+    stub = StubSearchServer(delay=0.05)
+    client = make_client(stub, max_concurrency=2)
+
+    async def run():
+        try:
+            return await client.search_many([f"query {i}" for i in range(6)])
+        finally:
+            await client.aclose()
+
+    try:
+        results = asyncio.run(run())
+    finally:
+        stub.close()
+
+    assert all(isinstance(r, list) for r in results)
+    assert len(stub.requests) == 6
+    assert stub.max_in_flight <= 2
+
+
+@pytest.mark.parametrize(
+    "first, second",
+    [
+        ("wildfire costs -aviation", "wildfire costs aviation"),
+        ('"air tanker" cost', "air tanker cost"),
+        ("C++ jobs", "C jobs"),
+        ("costs site:nifc.gov", "costs site nifc gov"),
+        ("aircraft OR helicopter", "aircraft or helicopter"),
+    ],
+)
+def test_query_operators_do_not_share_cache_keys(first, second):
+    assert SearchCache.make_key(first) != SearchCache.make_key(second)
+
+
+def test_normalize_query_ignores_case_spacing_and_final_punctuation():
+    assert normalize_query("  Aircraft\tCOSTS  in 2024? ") == "aircraft costs in 2024"
+    assert normalize_query('"Air Tanker" -Lease.') == '"air tanker" -lease'
+
+
+def test_cache_serves_normalized_repeat_queries(stub):
+    client = make_client(stub, cache=SearchCache())
+
+    async def run():
+        try:
+            first = await client.search("Aircraft  costs?")
+            second = await client.search("aircraft costs")
+            return first, second
+        finally:
+            await client.aclose()
+
+    first, second = asyncio.run(run())
+
+    assert first == second
+    assert len(stub.requests) == 1
+    assert client.cache.stats()["hits"] == 1
+
+
+def test_cache_is_keyed_on_engine_and_endpoint(stub):
+    cache = SearchCache()
+    other_stub = StubSearchServer()
+    clients = [
+        make_client(stub, cache=cache),
+        AsyncSearchClient("test-key", "other-cx", endpoint=stub.endpoint, cache=cache),
+        AsyncSearchClient("test-key", "test-cx", endpoint=other_stub.endpoint, cache=cache),
+    ]
+
+    async def run():
+        try:
+            for client in clients:
+                await client.search("shared query")
+        finally:
+            for client in clients:
+                await client.aclose()
+
+    try:
+        asyncio.run(run())
+    finally:
+        other_stub.close()
+
+    assert [r["cx"] for r in stub.requests] == ["test-cx", "other-cx"]
+    assert len(other_stub.requests) == 1
+    assert cache.stats()["hits"] == 0
+
+
+def test_empty_results_are_not_cached(stub):
+    client = make_client(stub, cache=SearchCache())
+
+    async def run():
+        try:
+            first = await client.search("empty query")
+            second = await client.search("empty query")
+            return first, second
+        finally:
+            await client.aclose()
+
+    assert asyncio.run(run()) == ([], [])
+    assert len(stub.requests) == 2
+
+
+def test_stale_hit_is_returned_and_refreshed_in_background(stub):
+    now = [1000.0]
+    cache = SearchCache(ttl_seconds=10.0, stale_seconds=100.0, clock=lambda: now[0])
+    client = make_client(stub, cache=cache)
+
+    async def run():
+        try:
+            await client.search("refresh me")
+            now[0] += 50.0
+            stale = await client.search("refresh me")
+            await asyncio.gather(*client._background)
+            return stale
+        finally:
+            await client.aclose()
+
+    stale = asyncio.run(run())
+
+    assert stale[0]["title"] == "Result for refresh me"
+    assert len(stub.requests) == 2
+    assert cache.stats()["stale_hits"] == 1
+
+
+def test_client_from_previous_loop_is_closed(stub):
+    client = make_client(stub)
+
+    asyncio.run(client.search("first loop"))
+    first_client = client._client
+
+    async def second():
+        try:
+            return await client.search("second loop")
+        finally:
+            await client.aclose()
+
+    assert asyncio.run(second())[0]["title"] == "Result for second loop"
+    assert first_client is not client._client
+    assert first_client.is_closed
+
+
+def test_google_search_many_reports_cancelled_queries(monkeypatch):
+    from wildfire_agent import main_agent
+
+    class _CancellingClient:
+        async def search_many(self, queries, num=5):
+            return [asyncio.CancelledError(), [{"title": f"Result for {queries[1]}"}]]
+
+    monkeypatch.setattr(main_agent, "SEARCH_API_KEY", "test-key")
+    monkeypatch.setattr(main_agent, "SEARCH_CSE_ID", "test-cx")
+    monkeypatch.setattr(main_agent, "_get_search_client", _CancellingClient)
+
+    text = asyncio.run(main_agent.google_search_many(["cancelled", "kept"], session_id="test-search"))
+
+    assert "Search was cancelled." in text
+    assert "Result for kept" in text
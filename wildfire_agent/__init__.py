@@ -1,2 +1,21 @@
-from .main_agent import root_agent
-from .summary_agent import summary_agent
+# wildfire_agent/__init__.py
+"""
+Wildfire cost agent.
+
+The agents are imported on first access (ADK looks up ``root_agent``
+with getattr), so importing a submodule such as ``wildfire_agent.parallel``
+in a worker process does not load ``main_agent``, the ADK runtime or
+their start-up side effects.
+"""
+
+_AGENTS = {"root_agent": ".main_agent", "summary_agent": ".summary_agent"}
+
+__all__ = list(_AGENTS)
+
+
+def __getattr__(name):
+    if name in _AGENTS:
+        import importlib
+
+        return getattr(importlib.import_module(_AGENTS[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
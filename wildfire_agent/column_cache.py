@@ -0,0 +1,266 @@
+# wildfire_agent/column_cache.py
+"""
+On-disk columnar cache of parsed cost ledgers, read back via mmap.
+
+The first read of a ledger version (see ``ledger.ledger_fingerprint``)
+parses it once and writes each column as a flat little-endian binary
+file (int32 region/category codes and year, float64 cost and hours)
+plus a ``meta.json`` with the row count and label lists. Later loads
+map those files read-only with ``np.memmap``: nothing is parsed or
+copied up front, and worker processes mapping the same files share the
+page cache instead of each holding a private copy.
+
+Layout: ``<cache_dir>/<sha1(fingerprint)>/{meta.json, <column>.bin}``.
+Entries are immutable; a changed ledger gets a new fingerprint and a
+new entry, and the least recently used entries beyond ``max_entries``
+are pruned.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .columnar import CostColumns, aggregate_columns
+from .ledger import DEFAULT_CHUNK_ROWS, factorize_labels, iter_ledger_frames
+
+logger = logging.getLogger("wildfire_cost_agent")
+
+# Bump when the on-disk layout changes; older entries are then ignored.
+CACHE_FORMAT = 1
+
+_DTYPES = {
+    "region_codes": "<i4",
+    "category_codes": "<i4",
+    "cost": "<f8",
+    "hours": "<f8",
+    "year": "<i4",
+}
+
+# Stored for rows whose year is missing.
+MISSING_YEAR = -1
+
+
+@dataclass
+class CachedColumns:
+    """
+    Memory-mapped columns of one cached ledger.
+
+    Attributes
+    ----------
+    path:
+        Cache entry directory.
+    columns:
+        Read-only ``CostColumns`` over the mapped files.
+    year:
+        Mapped year column, or None if the ledger has none.
+    """
+
+    path: str
+    columns: CostColumns
+    year: Optional[np.ndarray]
+
+    def __len__(self) -> int:
+        return len(self.columns)
+
+    def select(self, year: Optional[int] = None, start: int = 0, stop: Optional[int] = None) -> CostColumns:
+        """
+        Rows [start, stop), restricted to `year` if given and the ledger
+        has a year column. Without a year filter the result is a view.
+        """
+        c = self.columns
+        rows = slice(start, stop)
+        if year is None or self.year is None:
+            return CostColumns(
+                c.region_codes[rows], c.category_codes[rows], c.cost[rows], c.hours[rows],
+                c.regions, c.categories,
+            )
+        mask = self.year[rows] == year
+        return CostColumns(
+            c.region_codes[rows][mask], c.category_codes[rows][mask],
+            c.cost[rows][mask], c.hours[rows][mask],
+            c.regions, c.categories,
+        )
+
+
+def open_cached_columns(path: str) -> CachedColumns:
+    """Map a cache entry directory written by ``ColumnCache.build``."""
+    with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    rows = meta["rows"]
+
+    arrays: Dict[str, np.ndarray] = {}
+    for name in meta["columns"]:
+        if rows:
+            arrays[name] = np.memmap(
+                os.path.join(path, f"{name}.bin"), dtype=_DTYPES[name], mode="r", shape=(rows,)
+            )
+        else:
+            # mmap cannot map an empty file.
+            arrays[name] = np.zeros(0, dtype=_DTYPES[name])
+
+    columns = CostColumns(
+        arrays["region_codes"],
+        arrays["category_codes"],
+        arrays["cost"],
+        arrays["hours"],
+        meta["regions"],
+        meta["categories"],
+    )
+    return CachedColumns(path, columns, arrays.get("year"))
+
+
+def aggregate_cached(
+    path: str,
+    year: Optional[int] = None,
+    start: int = 0,
+    stop: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Aggregate rows [start, stop) of a cache entry by (region, category).
+
+    Takes the entry path rather than arrays, so worker processes can map
+    the files themselves.
+    """
+    return aggregate_columns(open_cached_columns(path).select(year, start, stop))
+
+
+class ColumnCache:
+    """
+    Directory of memory-mappable ledger column sets keyed by fingerprint.
+    """
+
+    def __init__(self, cache_dir: str, max_entries: int = 16) -> None:
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def path_for(self, fingerprint: str) -> str:
+        digest = hashlib.sha1(f"{CACHE_FORMAT}:{fingerprint}".encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, digest)
+
+    def get(self, fingerprint: str) -> Optional[CachedColumns]:
+        """Map the cached columns for `fingerprint`, or None if not cached."""
+        path = self.path_for(fingerprint)
+        if not os.path.exists(os.path.join(path, "meta.json")):
+            return None
+        try:
+            cached = open_cached_columns(path)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("Ignoring unreadable column cache entry %s: %s", path, e)
+            return None
+        # Directory mtime doubles as the LRU clock for pruning.
+        os.utime(path)
+        return cached
+
+    def build(self, fingerprint: str, frames: Iterable[pd.DataFrame]) -> CachedColumns:
+        """
+        Write ledger chunks (region, category, cost[, hours, year]) as a
+        cache entry for `fingerprint` and return it mapped.
+        """
+        path = self.path_for(fingerprint)
+        tmp = tempfile.mkdtemp(prefix=".building-", dir=self.cache_dir)
+        # Per-entry label -> code maps: stored codes index the entry's own labels.
+        regions: Dict[Any, int] = {}
+        categories: Dict[Any, int] = {}
+        files: Dict[str, Any] = {}
+        rows = 0
+        try:
+            for name in ("region_codes", "category_codes", "cost", "hours"):
+                files[name] = open(os.path.join(tmp, f"{name}.bin"), "wb")
+            for frame in frames:
+                if rows == 0 and "year" in frame.columns and "year" not in files:
+                    files["year"] = open(os.path.join(tmp, "year.bin"), "wb")
+                _write_frame(frame, files, regions, categories)
+                rows += len(frame)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        finally:
+            for f in files.values():
+                f.close()
+
+        try:
+            with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+                json.dump(
+                    {
+                        "format": CACHE_FORMAT,
+                        "fingerprint": fingerprint,
+                        "rows": rows,
+                        "columns": list(files),
+                        "regions": list(regions),
+                        "categories": list(categories),
+                    },
+                    f,
+                )
+            os.rename(tmp, path)
+        except OSError:
+            # Lost a race with another builder; its entry is identical.
+            shutil.rmtree(tmp, ignore_errors=True)
+            if not os.path.exists(os.path.join(path, "meta.json")):
+                raise
+
+        logger.info("Built column cache entry %s (rows=%d)", path, rows)
+        self._prune()
+        return open_cached_columns(path)
+
+    def get_or_build(
+        self,
+        fingerprint: str,
+        ledger_path: str,
+        chunk_rows: int = DEFAULT_CHUNK_ROWS,
+    ) -> CachedColumns:
+        """Return the cached columns of a ledger, parsing it on a miss."""
+        cached = self.get(fingerprint)
+        if cached is None:
+            cached = self.build(fingerprint, iter_ledger_frames(ledger_path, chunk_rows))
+        return cached
+
+    def _prune(self) -> None:
+        entries = [
+            os.path.join(self.cache_dir, name)
+            for name in os.listdir(self.cache_dir)
+            if not name.startswith(".")
+        ]
+        entries.sort(key=os.path.getmtime, reverse=True)
+        for path in entries[self.max_entries:]:
+            # Open maps keep their pages; the files go away on last unmap.
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def _write_frame(
+    frame: pd.DataFrame,
+    files: Dict[str, Any],
+    regions: Dict[Any, int],
+    categories: Dict[Any, int],
+) -> None:
+    """Append one ledger chunk to the open column files, re-coding its labels."""
+    for field, labels, name in (
+        ("region", regions, "region_codes"),
+        ("category", categories, "category_codes"),
+    ):
+        codes, uniques = factorize_labels(frame[field])
+        # Only the chunk's distinct labels are looked up.
+        remap = np.array(
+            [labels.setdefault(v, len(labels)) for v in uniques], dtype=_DTYPES[name]
+        )
+        files[name].write(remap[codes].tobytes())
+
+    files["cost"].write(frame["cost"].to_numpy(dtype=np.float64, na_value=0.0).tobytes())
+    if "hours" in frame.columns:
+        hours = frame["hours"].to_numpy(dtype=np.float64, na_value=0.0)
+    else:
+        hours = np.zeros(len(frame), dtype=np.float64)
+    files["hours"].write(hours.tobytes())
+    if "year" in files:
+        year = frame["year"].to_numpy(dtype=np.float64, na_value=MISSING_YEAR)
+        files["year"].write(year.astype(_DTYPES["year"]).tobytes())
@@ -0,0 +1,322 @@
+# wildfire_agent/columnar.py
+"""
+Columnar (NumPy) aggregation engine for wildfire cost records.
+
+Region and category are carried as small integer codes plus a list of
+labels; cost and hours are float64 arrays. The (region, category)
+group-by is a single vectorized ``np.bincount`` over a combined key, so
+aggregating millions of ledger lines does not touch Python per row.
+
+Codes are int32 and local to each batch (or column-cache entry), so
+label lists and the group-by key space stay as small as the batch's own
+vocabulary. Batches are combined by decoded labels
+(``merge_aggregations``); that merge runs over per-group rows, not
+records.
+"""
+
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger("wildfire_cost_agent")
+
+# Inputs smaller than this are aggregated with the plain dict loop in
+# main_agent.aggregate_costs; the NumPy setup cost isn't worth it there.
+COLUMNAR_MIN_ROWS = 1_000
+
+# Region/category code dtype (4 bytes per row instead of 8).
+CODE_DTYPE = np.int32
+
+# ``_group_sums`` allocates the full regions x categories key space only
+# when it has at most this many slots per input row.
+DENSE_KEYS_PER_ROW = 2
+
+
+@dataclass
+class CostColumns:
+    """
+    Column batch of cost records.
+
+    Attributes
+    ----------
+    region_codes, category_codes:
+        Integer arrays indexing into ``regions`` / ``categories``.
+    cost, hours:
+        float64 arrays, one entry per record.
+    regions, categories:
+        Label lists for decoding the codes.
+    """
+
+    region_codes: np.ndarray
+    category_codes: np.ndarray
+    cost: np.ndarray
+    hours: np.ndarray
+    regions: List[Any]
+    categories: List[Any]
+
+    def __len__(self) -> int:
+        return int(self.cost.shape[0])
+
+
+def encode_labels(values: Sequence[Any], dtype: Any = np.int64) -> tuple:
+    """Map labels to dense integer codes in first-seen order."""
+    index: Dict[Any, int] = {}
+    codes = np.fromiter(
+        (index.setdefault(v, len(index)) for v in values),
+        dtype=dtype,
+        count=len(values),
+    )
+    return codes, list(index)
+
+
+def records_to_columns(records: Sequence[Dict[str, Any]]) -> CostColumns:
+    """
+    Convert a list of record dicts (region, category, cost, hours) into
+    a ``CostColumns`` batch.
+    """
+    region_codes, regions = encode_labels([r.get("region") for r in records], CODE_DTYPE)
+    category_codes, categories = encode_labels([r.get("category") for r in records], CODE_DTYPE)
+    cost = np.asarray([r.get("cost", 0.0) for r in records], dtype=np.float64)
+    hours = np.asarray([r.get("hours", 0.0) for r in records], dtype=np.float64)
+    return CostColumns(region_codes, category_codes, cost, hours, regions, categories)
+
+
+def _group_sums(columns: CostColumns) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Per-group (count, cost, hours) sums over the combined key
+    ``region_code * n_categories + category_code``.
+
+    Returns the keys present (ascending) and their sums as aligned arrays.
+    The key space is only allocated densely when it is small next to the
+    batch; otherwise keys are compacted with ``np.unique`` first, so the
+    work never scales with the size of the label lists.
+    """
+    n_categories = len(columns.categories)
+    size = len(columns.regions) * n_categories
+    # Build the key as intp once; bincount would otherwise convert the
+    # int32 codes on each of its three passes.
+    key = columns.region_codes.astype(np.intp) * n_categories + columns.category_codes
+
+    if size <= DENSE_KEYS_PER_ROW * len(key):
+        counts = np.bincount(key, minlength=size)
+        present = np.flatnonzero(counts)
+        total_cost = np.bincount(key, weights=columns.cost, minlength=size)
+        total_hours = np.bincount(key, weights=columns.hours, minlength=size)
+        return present, counts[present], total_cost[present], total_hours[present]
+
+    present, inverse = np.unique(key, return_inverse=True)
+    n_groups = len(present)
+    counts = np.bincount(inverse, minlength=n_groups)
+    total_cost = np.bincount(inverse, weights=columns.cost, minlength=n_groups)
+    total_hours = np.bincount(inverse, weights=columns.hours, minlength=n_groups)
+    return present, counts, total_cost, total_hours
+
+
+def aggregate_columns(columns: CostColumns) -> List[Dict[str, Any]]:
+    """
+    Aggregate a column batch by (region, category).
+
+    Returns
+    -------
+    List[Dict[str, Any]]:
+        Same row shape as ``main_agent.aggregate_costs`` (region, category,
+        total_cost, hours), sorted by total_cost descending.
+    """
+    n_regions = len(columns.regions)
+    n_categories = len(columns.categories)
+    if len(columns) == 0 or n_regions == 0 or n_categories == 0:
+        return []
+
+    keys, _, total_cost, total_hours = _group_sums(columns)
+    # Stable sort keeps a deterministic group order on cost ties.
+    order = np.argsort(-total_cost, kind="stable")
+
+    regions = columns.regions
+    categories = columns.categories
+    return [
+        {
+            "region": regions[k // n_categories],
+            "category": categories[k % n_categories],
+            "total_cost": cost,
+            "hours": hours,
+        }
+        for k, cost, hours in zip(
+            keys[order].tolist(),
+            total_cost[order].tolist(),
+            total_hours[order].tolist(),
+        )
+    ]
+
+
+def aggregate_column_batches(batches: Iterable[CostColumns]) -> List[Dict[str, Any]]:
+    """
+    Aggregate a stream of column batches by (region, category).
+
+    Each batch is reduced with ``aggregate_columns`` and merged into running
+    totals keyed by the decoded labels, so batches may use independent code
+    spaces and only one batch is held in memory at a time.
+    """
+    return merge_aggregations(aggregate_columns(batch) for batch in batches)
+
+
+def merge_aggregations(partials: Iterable[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """
+    Merge partial (region, category) aggregations into one, sorted by
+    total_cost descending. Rows of the first partial holding a group are
+    reused as the running totals, so partials must not be shared (cached)
+    lists.
+    """
+    totals: Dict[Tuple[Any, Any], Dict[str, Any]] = {}
+
+    for partial in partials:
+        for row in partial:
+            key = (row["region"], row["category"])
+            if key not in totals:
+                totals[key] = row
+            else:
+                totals[key]["total_cost"] += row["total_cost"]
+                totals[key]["hours"] += row["hours"]
+
+    aggregated_list = list(totals.values())
+    aggregated_list.sort(key=lambda x: x["total_cost"], reverse=True)
+    return aggregated_list
+
+
+class IncrementalAggregator:
+    """
+    Running (region, category) aggregation that accepts append and
+    retraction deltas.
+
+    ``apply`` / ``apply_columns`` cost O(len(delta)): only the groups a
+    delta touches are updated (or dropped, once their record count falls
+    to zero), and nothing is sorted. Ordering is lazy: ``rows`` sorts the
+    groups by total_cost descending when it is read after a change, and
+    ``snapshot`` copies them. The row dicts in ``rows`` are owned by the
+    aggregator and updated in place by later deltas, so callers that keep
+    rows should take a ``snapshot``.
+
+    Retractions for groups the aggregation does not hold are skipped and
+    reported back by ``apply`` / ``apply_columns``.
+    """
+
+    # Approximate bytes per group (row dict, key tuple, count), for
+    # session size accounting (``session_store.estimate_size`` reads
+    # ``nbytes``).
+    GROUP_NBYTES = 512
+
+    def __init__(self, aggregated: Optional[Iterable[Dict[str, Any]]] = None) -> None:
+        self._groups: Dict[Tuple[Any, Any], Dict[str, Any]] = {}
+        # Records contributing to each group; None for groups seeded from
+        # pre-aggregated rows, which are then never dropped automatically.
+        self._counts: Dict[Tuple[Any, Any], Optional[int]] = {}
+        # Sorted view of the groups; None when a delta has changed them.
+        self._rows: Optional[List[Dict[str, Any]]] = None
+        for row in aggregated or []:
+            key = (row["region"], row["category"])
+            self._groups[key] = {
+                "region": row["region"],
+                "category": row["category"],
+                "total_cost": float(row.get("total_cost", 0.0)),
+                "hours": float(row.get("hours", 0.0)),
+            }
+            self._counts[key] = None
+
+    def __len__(self) -> int:
+        return len(self._groups)
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._groups) * self.GROUP_NBYTES
+
+    @property
+    def rows(self) -> List[Dict[str, Any]]:
+        """Groups sorted by total_cost descending (``aggregate_columns`` shape)."""
+        if self._rows is None:
+            self._rows = sorted(
+                self._groups.values(), key=lambda x: x["total_cost"], reverse=True
+            )
+        return self._rows
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Copy of ``rows`` that later deltas do not change."""
+        return [dict(r) for r in self.rows]
+
+    def apply(
+        self,
+        records: Iterable[Dict[str, Any]],
+        retract: bool = False,
+    ) -> List[Tuple[Any, Any]]:
+        """
+        Add (or, with ``retract=True``, remove) raw records.
+
+        Returns the (region, category) keys of retracted records whose
+        group does not exist, in first-seen order; those records are
+        ignored.
+        """
+        sign = -1.0 if retract else 1.0
+        touched: Dict[Tuple[Any, Any], None] = {}
+        unmatched: Dict[Tuple[Any, Any], None] = {}
+        for r in records:
+            key = (r.get("region"), r.get("category"))
+            if self._add(
+                key,
+                sign * float(r.get("cost", 0.0)),
+                sign * float(r.get("hours", 0.0)),
+                -1 if retract else 1,
+            ):
+                touched[key] = None
+            else:
+                unmatched[key] = None
+        self._finish(touched)
+        return list(unmatched)
+
+    def apply_columns(self, columns: CostColumns, retract: bool = False) -> List[Tuple[Any, Any]]:
+        """Column-batch version of ``apply`` for large deltas."""
+        if len(columns) == 0:
+            return []
+        sign = -1 if retract else 1
+        touched = []
+        unmatched = []
+        n_categories = len(columns.categories)
+        keys, counts, total_cost, total_hours = _group_sums(columns)
+        for k, n, cost, hours in zip(
+            keys.tolist(), counts.tolist(), total_cost.tolist(), total_hours.tolist()
+        ):
+            key = (columns.regions[k // n_categories], columns.categories[k % n_categories])
+            if self._add(key, sign * cost, sign * hours, sign * n):
+                touched.append(key)
+            else:
+                unmatched.append(key)
+        self._finish(touched)
+        return unmatched
+
+    def _add(self, key: Tuple[Any, Any], cost: float, hours: float, count: int) -> bool:
+        """Apply one delta to a group; False if it retracts a missing group."""
+        group = self._groups.get(key)
+        if group is None:
+            if count < 0:
+                return False
+            group = {"region": key[0], "category": key[1], "total_cost": 0.0, "hours": 0.0}
+            self._groups[key] = group
+            self._counts[key] = 0
+        group["total_cost"] += cost
+        group["hours"] += hours
+        if self._counts[key] is not None:
+            self._counts[key] += count
+        return True
+
+    def _finish(self, touched: Iterable[Tuple[Any, Any]]) -> None:
+        for key in touched:
+            n = self._counts.get(key)
+            if n is not None and n <= 0:
+                del self._groups[key]
+                del self._counts[key]
+        self._rows = None
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # The sorted view is rebuilt on demand; don't persist it.
+        return {**self.__dict__, "_rows": None}
@@ -0,0 +1,141 @@
+# wildfire_agent/context.py
+"""
+Token-budget-aware context compaction.
+
+Chooses how much of an aggregation to show so the rendered cost table
+fits a token budget in the model context. Options are tried from most
+to least detailed:
+
+  1. every (region, category) row, cents precision
+  2. every row, whole-dollar precision, with full, brief, then no Key
+     Insights
+  3. top-k rows + "Other" remainder, whole dollars (largest k that fits),
+     with brief, then no insights
+  4. category-only rollup (regions collapsed), then its top-k
+
+Detail (3) wins over rollup (4) as long as it keeps at least
+MIN_DETAIL_ROWS real buckets. The result always shows at least one data
+row, even when that overshoots the budget.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, List, Tuple
+
+# Rough average for English/markdown text with Gemini tokenizers.
+CHARS_PER_TOKEN = 4
+
+MIN_DETAIL_ROWS = 3
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count of `text`."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def rollup_by_category(aggregated: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Collapse regions: one row per category (region "All"), sorted by
+    total_cost descending. Remainder rows are merged into one remainder.
+    """
+    totals: Dict[Any, Dict[str, Any]] = {}
+    remainder = None
+    for r in aggregated:
+        if r.get("remainder"):
+            if remainder is None:
+                remainder = dict(r)
+            else:
+                remainder["total_cost"] += r["total_cost"]
+                remainder["hours"] += r["hours"]
+            continue
+        category = r.get("category")
+        if category not in totals:
+            totals[category] = {"region": "All", "category": category, "total_cost": 0.0, "hours": 0.0}
+        totals[category]["total_cost"] += float(r.get("total_cost", 0.0))
+        totals[category]["hours"] += float(r.get("hours", 0.0))
+
+    rows = sorted(totals.values(), key=lambda x: x["total_cost"], reverse=True)
+    if remainder is not None:
+        rows.append(remainder)
+    return rows
+
+
+def fit_token_budget(
+    aggregated: List[Dict[str, Any]],
+    max_tokens: int,
+    render: Callable[..., str],
+    compact: Callable[[List[Dict[str, Any]], int], List[Dict[str, Any]]],
+) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Pick rows and render options so
+    ``render(rows, cost_decimals, insights_detail=...)`` fits within
+    `max_tokens`.
+
+    Parameters
+    ----------
+    aggregated:
+        Aggregated rows (region, category, total_cost, hours).
+    render:
+        ``render(rows, cost_decimals, insights_detail=...) -> str`` (e.g.
+        the build_cost_table renderer); insights_detail is one of
+        ``insights.INSIGHTS_DETAIL_LEVELS``.
+    compact:
+        ``compact(rows, k) -> rows`` keeping the top k plus a remainder row.
+
+    Returns
+    -------
+    (rows, options):
+        options has cost_decimals, insights_detail, rollup ("none" /
+        "category"), and estimated_tokens. Rows always include at least
+        one data row: if nothing fits, the smallest such candidate is
+        returned.
+    """
+
+    def tokens(rows: List[Dict[str, Any]], decimals: int, detail: str) -> int:
+        return estimate_tokens(render(rows, decimals, insights_detail=detail))
+
+    def result(
+        rows: List[Dict[str, Any]],
+        decimals: int,
+        detail: str,
+        rollup: str,
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        return rows, {
+            "cost_decimals": decimals,
+            "insights_detail": detail,
+            "rollup": rollup,
+            "estimated_tokens": tokens(rows, decimals, detail),
+        }
+
+    def best_top_k(rows: List[Dict[str, Any]], detail: str) -> Tuple[int, List[Dict[str, Any]]]:
+        # Rendered size grows with k, so binary-search the largest k that
+        # fits; k = 0 (nothing fits) still returns the top-1 candidate.
+        lo, hi = 1, len(rows)
+        best_k, best = 0, compact(rows, 1)
+        while lo <= hi:
+            mid = (lo + hi) // 2
+            candidate = compact(rows, mid)
+            if tokens(candidate, 0, detail) <= max_tokens:
+                best_k, best, lo = mid, candidate, mid + 1
+            else:
+                hi = mid - 1
+        return best_k, best
+
+    # Every row: give up precision, then the insights, before any rows.
+    for decimals, detail in ((2, "full"), (0, "full"), (0, "brief"), (0, "none")):
+        if tokens(aggregated, decimals, detail) <= max_tokens:
+            return result(aggregated, decimals, detail, "none")
+
+    for detail in ("brief", "none"):
+        k, detail_top = best_top_k(aggregated, detail)
+        if k >= MIN_DETAIL_ROWS:
+            return result(detail_top, 0, detail, "none")
+
+    rolled = rollup_by_category(aggregated)
+    for detail in ("brief", "none"):
+        if tokens(rolled, 0, detail) <= max_tokens:
+            return result(rolled, 0, detail, "category")
+    k_rolled, rolled_top = best_top_k(rolled, "none")
+    if k_rolled >= k:
+        return result(rolled_top, 0, "none", "category")
+    return result(detail_top, 0, "none", "none")
@@ -0,0 +1,246 @@
+# wildfire_agent/cube.py
+"""
+Precomputed rollup cube over wildfire cost records.
+
+The cube aggregates cost, hours and record count at the finest grain of
+its dimensions (e.g. region x category x year x fire_id x month) once,
+then materializes every rollup level (each subset of the dimensions)
+from those finest groups. Drill-down / roll-up queries become a lookup
+plus an optional filter over a small, already-aggregated level instead
+of a pass over the raw records.
+"""
+
+from __future__ import annotations
+
+import itertools
+import logging
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from .columnar import encode_labels
+from .records import CostRecordTable
+
+logger = logging.getLogger("wildfire_cost_agent")
+
+DEFAULT_DIMENSIONS = ("region", "category", "year", "fire_id", "month")
+
+# Label used in the region/category columns of rows rolled up over them.
+ALL_LABEL = "All"
+
+
+def normalize_filters(filters: Optional[Dict[str, Any]]) -> Dict[str, List[Any]]:
+    """
+    {dimension: allowed values} with each value list made a list.
+
+    A single value (``{"region": "North"}``, as models often send it) is
+    wrapped in a list rather than iterated, which would filter by its
+    characters. Empty entries (None, "", []) are dropped.
+    """
+    normalized: Dict[str, List[Any]] = {}
+    for dim, values in (filters or {}).items():
+        if values is None or values == "":
+            continue
+        if isinstance(values, (str, bytes)) or not isinstance(values, Iterable):
+            values = [values]
+        values = list(values)
+        if values:
+            normalized[dim] = values
+    return normalized
+
+
+class CostCube:
+    """
+    Cost cube with every rollup level materialized.
+
+    Use ``CostCube.from_records`` to build one, then ``query``.
+
+    Attributes
+    ----------
+    dimensions:
+        Dimension names, in order.
+    labels:
+        Per dimension, the list of labels (codes index into it).
+    levels:
+        frozenset(dimensions) -> {"codes": {dim: int array}, "total_cost",
+        "hours", "count"}; one entry per subset of ``dimensions``.
+    """
+
+    def __init__(
+        self,
+        dimensions: Sequence[str],
+        labels: Dict[str, List[Any]],
+        levels: Dict[FrozenSet[str], Dict[str, Any]],
+    ) -> None:
+        self.dimensions = tuple(dimensions)
+        self.labels = labels
+        self.levels = levels
+
+    @classmethod
+    def from_records(
+        cls,
+        records: Sequence[Dict[str, Any]],
+        dimensions: Sequence[str] = DEFAULT_DIMENSIONS,
+    ) -> "CostCube":
+        """
+        Build a cube from raw records (dimension fields + cost, hours).
+
+        Dimensions missing from every record are dropped; a dimension
+        missing from some records groups those under None.
+        """
+        if isinstance(records, CostRecordTable):
+            # Read whole columns instead of materializing rows.
+            dimensions = [d for d in dimensions if records.has_field(d)]
+            field = records.field
+            cost = records.columns.cost
+            hours = records.columns.hours
+        else:
+            dimensions = [d for d in dimensions if any(d in r for r in records)]
+            field = lambda name: [r.get(name) for r in records]
+            cost = np.asarray([r.get("cost", 0.0) for r in records], dtype=np.float64)
+            hours = np.asarray([r.get("hours", 0.0) for r in records], dtype=np.float64)
+
+        labels: Dict[str, List[Any]] = {}
+        codes: List[np.ndarray] = []
+        for dim in dimensions:
+            dim_codes, dim_labels = encode_labels(field(dim))
+            codes.append(dim_codes)
+            labels[dim] = dim_labels
+
+        # Finest grain: unique combinations actually present.
+        if dimensions and len(records):
+            stacked = np.stack(codes, axis=1)
+            finest, inverse = np.unique(stacked, axis=0, return_inverse=True)
+            inverse = inverse.reshape(-1)
+        else:
+            finest = np.zeros((1 if len(records) else 0, 0), dtype=np.int64)
+            inverse = np.zeros(len(records), dtype=np.int64)
+        n_groups = finest.shape[0]
+        base = {
+            "codes": finest,
+            "total_cost": np.bincount(inverse, weights=cost, minlength=n_groups),
+            "hours": np.bincount(inverse, weights=hours, minlength=n_groups),
+            "count": np.bincount(inverse, minlength=n_groups),
+        }
+
+        levels: Dict[FrozenSet[str], Dict[str, Any]] = {}
+        for size in range(len(dimensions) + 1):
+            for dims in itertools.combinations(range(len(dimensions)), size):
+                levels[frozenset(dimensions[i] for i in dims)] = _rollup(
+                    base, list(dims), [dimensions[i] for i in dims]
+                )
+
+        logger.info(
+            "Built cost cube (records=%d, dimensions=%s, finest_groups=%d, levels=%d)",
+            len(records),
+            list(dimensions),
+            n_groups,
+            len(levels),
+        )
+        return cls(dimensions, labels, levels)
+
+    def query(
+        self,
+        group_by: Iterable[str],
+        filters: Optional[Dict[str, Sequence[Any]]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Return aggregated rows grouped by `group_by`, restricted by `filters`
+        ({dimension: allowed values}, or a single value), sorted by
+        total_cost descending.
+
+        Rows carry the group_by fields plus total_cost, hours and count;
+        region/category are always present so rows render with
+        build_cost_table.
+
+        Raises ValueError if `group_by` or `filters` name a dimension the
+        cube does not have.
+        """
+        group_by = list(dict.fromkeys(group_by))
+        filters = normalize_filters(filters)
+        unknown = [d for d in [*group_by, *filters] if d not in self.dimensions]
+        if unknown:
+            raise ValueError(
+                f"Unsupported dimension(s) {', '.join(map(repr, dict.fromkeys(unknown)))}; "
+                f"this dataset has {', '.join(self.dimensions)}."
+            )
+        level = self.levels[frozenset(group_by) | frozenset(filters)]
+
+        mask = np.ones(len(level["total_cost"]), dtype=bool)
+        for dim, values in filters.items():
+            # Compare as strings: the model sends years etc. as text.
+            wanted = {str(v) for v in values}
+            allowed = [i for i, label in enumerate(self.labels[dim]) if str(label) in wanted]
+            mask &= np.isin(level["codes"][dim], allowed)
+
+        if set(filters) - set(group_by):
+            # Filtered on extra dimensions: re-group the (small) level.
+            sub = {
+                "codes": np.stack([level["codes"][d][mask] for d in group_by], axis=1)
+                if group_by
+                else np.zeros((int(mask.sum()), 0), dtype=np.int64),
+                "total_cost": level["total_cost"][mask],
+                "hours": level["hours"][mask],
+                "count": level["count"][mask],
+            }
+            level = _regroup(sub, group_by)
+            mask = np.ones(len(level["total_cost"]), dtype=bool)
+
+        idx = np.flatnonzero(mask)
+        idx = idx[np.argsort(-level["total_cost"][idx], kind="stable")]
+
+        # Rolled-up region/category read "All", or the value when the query
+        # is filtered to exactly one.
+        fixed = {"region": ALL_LABEL, "category": ALL_LABEL}
+        for dim in fixed:
+            if dim in filters and len(filters[dim]) == 1:
+                fixed[dim] = filters[dim][0]
+
+        rows = []
+        for i in idx.tolist():
+            row: Dict[str, Any] = dict(fixed)
+            for dim in group_by:
+                row[dim] = self.labels[dim][level["codes"][dim][i]]
+            row["total_cost"] = float(level["total_cost"][i])
+            row["hours"] = float(level["hours"][i])
+            row["count"] = int(level["count"][i])
+            rows.append(row)
+        return rows
+
+
+def _regroup(base: Dict[str, Any], names: List[str]) -> Dict[str, Any]:
+    """Sum groups of `base` (codes as a 2-D array) over their unique code rows."""
+    codes = base["codes"]
+    if codes.shape[0] == 0:
+        return {
+            "codes": {n: np.zeros(0, dtype=np.int64) for n in names},
+            "total_cost": np.zeros(0),
+            "hours": np.zeros(0),
+            "count": np.zeros(0, dtype=np.int64),
+        }
+    if codes.shape[1]:
+        keys, inverse = np.unique(codes, axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+    else:
+        keys = np.zeros((1, 0), dtype=np.int64)
+        inverse = np.zeros(codes.shape[0], dtype=np.int64)
+    n = keys.shape[0]
+    return {
+        "codes": {name: keys[:, j] for j, name in enumerate(names)},
+        "total_cost": np.bincount(inverse, weights=base["total_cost"], minlength=n),
+        "hours": np.bincount(inverse, weights=base["hours"], minlength=n),
+        "count": np.bincount(inverse, weights=base["count"], minlength=n).astype(np.int64),
+    }
+
+
+def _rollup(base: Dict[str, Any], columns: List[int], names: List[str]) -> Dict[str, Any]:
+    """Materialize the level keeping dimension `columns` of the finest grain."""
+    return _regroup(
+        {
+            "codes": base["codes"][:, columns],
+            "total_cost": base["total_cost"],
+            "hours": base["hours"],
+            "count": base["count"],
+        },
+        names,
+    )
@@ -0,0 +1,286 @@
+# wildfire_agent/insights.py
+"""
+Key-insight statistics for aggregated cost rows.
+
+``compute_insights`` derives everything the "Key Insights" section of a
+cost table states from the rows themselves, for whatever categories and
+regions the data has: overall totals and cost per hour, the top-k
+buckets, each category's share and cost per hour, and how concentrated
+each region's spend is in its largest category. Rows are read into
+arrays once and every statistic is a NumPy reduction over them, so the
+cost is one pass regardless of how many categories there are.
+
+Compaction remainder rows (``remainder: True``) count toward the totals
+but are not attributed to any bucket, category or region.
+
+Results are small and immutable, so callers cache them next to the
+aggregation they describe (see ``main_agent.AGGREGATION_CACHE``).
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .columnar import encode_labels
+
+# Buckets / regions reported by default.
+DEFAULT_TOP_K = 3
+
+# Categories kept (and listed) individually; the rest are only counted.
+MAX_LISTED_CATEGORIES = 6
+
+# ``render_insights`` detail levels, most to least verbose: every
+# section, only the total and largest bucket, or nothing.
+INSIGHTS_DETAIL_LEVELS = ("full", "brief", "none")
+
+
+@dataclass(frozen=True)
+class CategoryInsight:
+    category: Any
+    total_cost: float
+    hours: float
+    share: float
+    cost_per_hour: Optional[float]
+
+
+@dataclass(frozen=True)
+class RegionInsight:
+    region: Any
+    total_cost: float
+    share: float
+    top_category: Any
+    top_category_share: float
+
+
+@dataclass(frozen=True)
+class CostInsights:
+    """
+    Attributes
+    ----------
+    total_cost, total_hours:
+        Sums over all rows, remainder rows included.
+    cost_per_hour:
+        Cost per hour over the buckets that report hours, or None.
+    buckets:
+        Number of attributed (non-remainder) rows.
+    remainder_cost:
+        Cost in remainder rows.
+    top:
+        Up to top_k highest-cost buckets as (region, category, cost, share).
+    categories:
+        Stats of the MAX_LISTED_CATEGORIES highest-cost categories, highest
+        first; ``category_count`` is the total number of categories.
+    regions:
+        Stats of the top_k highest-cost regions, highest first;
+        ``region_count`` is the total number of regions.
+    """
+
+    total_cost: float
+    total_hours: float
+    cost_per_hour: Optional[float]
+    buckets: int
+    remainder_cost: float
+    top: Tuple[Tuple[Any, Any, float, float], ...]
+    categories: Tuple[CategoryInsight, ...]
+    category_count: int
+    regions: Tuple[RegionInsight, ...]
+    region_count: int
+
+
+def _ratio(num: float, den: float) -> float:
+    return num / den if den else 0.0
+
+
+def _largest(values: np.ndarray, k: int) -> List[int]:
+    """Indices of the k largest values, largest first (partial selection)."""
+    n = len(values)
+    k = min(max(k, 0), n)
+    if not k:
+        return []
+    idx = np.argpartition(-values, k - 1)[:k] if k < n else np.arange(n)
+    return idx[np.argsort(-values[idx], kind="stable")].tolist()
+
+
+def compute_insights(
+    aggregated: Sequence[Dict[str, Any]],
+    top_k: int = DEFAULT_TOP_K,
+) -> CostInsights:
+    """Compute ``CostInsights`` for aggregated (region, category) rows."""
+    region_values: List[Any] = []
+    category_values: List[Any] = []
+    cost_values: List[float] = []
+    hours_values: List[float] = []
+    remainder_rows: List[int] = []
+    for i, row in enumerate(aggregated):
+        get = row.get
+        region_values.append(get("region", ""))
+        category_values.append(get("category", ""))
+        cost_values.append(get("total_cost", 0.0))
+        hours_values.append(get("hours", 0.0))
+        if get("remainder"):
+            remainder_rows.append(i)
+    cost = np.asarray(cost_values, dtype=np.float64)
+    hours = np.asarray(hours_values, dtype=np.float64)
+    remainder = np.zeros(len(cost), dtype=bool)
+    remainder[remainder_rows] = True
+
+    total_cost = float(cost.sum())
+    total_hours = float(hours.sum())
+
+    keep = ~remainder
+    remainder_cost = float(cost[remainder].sum())
+    if not keep.all():
+        region_values = [v for v, k in zip(region_values, keep.tolist()) if k]
+        category_values = [v for v, k in zip(category_values, keep.tolist()) if k]
+        cost, hours = cost[keep], hours[keep]
+    buckets = len(cost)
+
+    # Cost per hour only over buckets that report hours (e.g. aircraft),
+    # so categories without hour tracking do not inflate it.
+    timed_cost = np.where(hours > 0, cost, 0.0)
+    timed_hours = float(hours[hours > 0].sum())
+    cost_per_hour = float(timed_cost.sum()) / timed_hours if timed_hours else None
+
+    top = tuple(
+        (region_values[i], category_values[i], float(cost[i]), _ratio(float(cost[i]), total_cost))
+        for i in _largest(cost, top_k)
+    )
+
+    region_codes, regions = encode_labels(region_values)
+    category_codes, categories = encode_labels(category_values)
+    n_categories = len(categories)
+
+    category_cost = np.bincount(category_codes, weights=cost, minlength=n_categories)
+    category_hours = np.bincount(category_codes, weights=hours, minlength=n_categories)
+    category_timed = np.bincount(category_codes, weights=timed_cost, minlength=n_categories)
+    category_stats = tuple(
+        CategoryInsight(
+            categories[c],
+            float(category_cost[c]),
+            float(category_hours[c]),
+            _ratio(float(category_cost[c]), total_cost),
+            float(category_timed[c] / category_hours[c]) if category_hours[c] > 0 else None,
+        )
+        for c in _largest(category_cost, MAX_LISTED_CATEGORIES)
+    )
+
+    # Region x category spend; each region's largest category is its
+    # concentration. Only observed pairs are materialized.
+    pair_keys, pair_index = np.unique(region_codes * n_categories + category_codes, return_inverse=True)
+    pair_cost = np.bincount(pair_index, weights=cost, minlength=len(pair_keys))
+    pair_region = pair_keys // n_categories if n_categories else pair_keys
+    order = np.lexsort((-pair_cost, pair_region))
+    first = order[np.r_[True, pair_region[order][1:] != pair_region[order][:-1]]] if len(order) else order
+    region_cost = np.bincount(region_codes, weights=cost, minlength=len(regions))
+    top_regions = _largest(region_cost, top_k)
+    region_top = dict.fromkeys(top_regions)
+    for p in first.tolist():
+        r = int(pair_region[p])
+        if r in region_top:
+            region_top[r] = (categories[int(pair_keys[p] % n_categories)], float(pair_cost[p]))
+    region_stats = tuple(
+        RegionInsight(
+            regions[r],
+            float(region_cost[r]),
+            _ratio(float(region_cost[r]), total_cost),
+            region_top[r][0],
+            _ratio(region_top[r][1], float(region_cost[r])),
+        )
+        for r in top_regions
+    )
+
+    return CostInsights(
+        total_cost=total_cost,
+        total_hours=total_hours,
+        cost_per_hour=cost_per_hour,
+        buckets=buckets,
+        remainder_cost=remainder_cost,
+        top=top,
+        categories=category_stats,
+        category_count=n_categories,
+        regions=region_stats,
+        region_count=len(regions),
+    )
+
+
+def _label(value: Any) -> str:
+    text = str(value)
+    return text[:1].upper() + text[1:]
+
+
+def render_insights(
+    insights: CostInsights,
+    cost_decimals: int = 2,
+    top_k: int = DEFAULT_TOP_K,
+    detail: str = "full",
+) -> str:
+    """
+    Render the "Key Insights" section for ``build_cost_table``.
+
+    `detail` is one of INSIGHTS_DETAIL_LEVELS; "none" gives "".
+    """
+    if detail == "none":
+        return ""
+    if detail == "brief":
+        top_k = 1
+    d = cost_decimals
+    lines = [
+        "Here's a summary of the wildfire costs based on the data:\n",
+        "**Key Insights:**",
+    ]
+
+    buckets = insights.buckets
+    total = f"- **Total:** ${insights.total_cost:,.{d}f} over {buckets} bucket{'' if buckets == 1 else 's'}"
+    if insights.cost_per_hour is not None:
+        total += f"; ${insights.cost_per_hour:,.{d}f}/hour over {insights.total_hours:,.1f} logged hours"
+    lines.append(total + ".")
+
+    top = insights.top[:max(top_k, 1)]
+    if top:
+        lines.append(
+            f"- **Largest Bucket{'s' if len(top) > 1 else ''}:** "
+            + "; ".join(f"{r} – {c} at ${v:,.{d}f} ({share:.1%})" for r, c, v, share in top)
+            + "."
+        )
+    if detail == "brief":
+        return "\n".join(lines)
+
+    categories = insights.categories
+    if categories:
+        listed = ", ".join(
+            f"{_label(c.category)} (${c.total_cost:,.{d}f}, {c.share:.1%}"
+            + (f", ${c.cost_per_hour:,.{d}f}/hour)" if c.cost_per_hour is not None else ")")
+            for c in categories
+        )
+        if insights.category_count > len(categories):
+            listed += f", and {insights.category_count - len(categories)} more"
+        lines.append(f"- **By Category:** {listed}.")
+
+    if insights.region_count > 1:
+        lines.append(
+            "- **Regional Concentration:** "
+            + "; ".join(
+                f"{r.region} {r.share:.1%} ({r.top_category} {r.top_category_share:.0%} of it)"
+                for r in insights.regions[:max(top_k, 1)]
+            )
+            + "."
+        )
+
+    if insights.remainder_cost:
+        lines.append(
+            f"- Smaller buckets cut by compaction hold ${insights.remainder_cost:,.{d}f} "
+            f"({_ratio(insights.remainder_cost, insights.total_cost):.1%}), not broken down above."
+        )
+
+    if len(categories) > 1:
+        first, second = categories[0], categories[1]
+        lines.append(
+            f"- {_label(first.category)} is the main cost driver, "
+            f"{first.share / second.share:.1f}x {second.category}."
+            if second.share > 0
+            else f"- {_label(first.category)} accounts for all attributed cost."
+        )
+    return "\n".join(lines)
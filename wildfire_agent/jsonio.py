@@ -0,0 +1,108 @@
+# wildfire_agent/jsonio.py
+"""
+JSON (de)serialization at the tool boundary.
+
+Models often hand cost rows back to tools as a JSON string rather than a
+list. ``decode_rows`` parses such strings with orjson when it is
+installed (several times faster than the stdlib parser on large arrays),
+falling back to ``json`` otherwise. It also:
+
+  - rejects payloads over a byte limit before parsing them;
+  - checks the shape (a JSON array of objects);
+  - coerces the numeric fields (cost, total_cost, hours) in the same
+    pass, so values the model wrote as strings ("$1,250.00") or nulls do
+    not break rendering or aggregation later.
+
+``dumps`` is the matching serializer, with NumPy scalars and arrays
+handled natively. It is used where this package writes JSON itself (the
+search disk cache, span output sizes in metrics.py). Tool results are
+not passed through it: tools return dicts and lists, and the ADK puts
+them into the function response as they are. A tool returning
+``dumps(rows)`` instead would hand the model a JSON string inside that
+response, escaped a second time.
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, List, Sequence, Union
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+# Largest JSON payload accepted from a tool argument.
+MAX_JSON_BYTES = 16 * 1024 * 1024
+
+NUMERIC_FIELDS = ("cost", "total_cost", "hours")
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    """Parse JSON text."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(value: Any, sort_keys: bool = False) -> str:
+    """Serialize `value` to compact JSON text."""
+    if orjson is not None:
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(value, default=_default, option=option).decode("utf-8")
+    return json.dumps(value, default=_default, sort_keys=sort_keys, separators=(",", ":"))
+
+
+def _to_number(value: Any) -> float:
+    if isinstance(value, str):
+        text = value.strip().replace(",", "").replace("$", "")
+        return float(text) if text else 0.0
+    return 0.0 if value is None else float(value)
+
+
+def decode_rows(
+    data: Union[str, bytes],
+    max_bytes: int = MAX_JSON_BYTES,
+    numeric_fields: Sequence[str] = NUMERIC_FIELDS,
+) -> List[Dict[str, Any]]:
+    """
+    Parse a JSON array of row objects, coercing `numeric_fields` to float.
+
+    Raises ValueError if the payload is larger than `max_bytes`, is not
+    valid JSON, is not an array of objects, or has a numeric field that
+    cannot be read as a number.
+    """
+    size = len(data) if isinstance(data, bytes) else len(data.encode("utf-8"))
+    if size > max_bytes:
+        raise ValueError(f"JSON payload is {size:,} bytes; the limit is {max_bytes:,}.")
+
+    rows = loads(data)
+    if not isinstance(rows, list):
+        raise ValueError("Expected a JSON array of row objects.")
+
+    for i, row in enumerate(rows):
+        if type(row) is not dict:
+            raise ValueError(f"Row {i} is not a JSON object.")
+        for field in numeric_fields:
+            value = row.get(field)
+            # Well-formed rows take only these type checks.
+            if value is None and field not in row:
+                continue
+            if type(value) is not float:
+                try:
+                    row[field] = _to_number(value)
+                except (TypeError, ValueError):
+                    raise ValueError(f"Row {i}: {field}={value!r} is not a number.") from None
+    return rows
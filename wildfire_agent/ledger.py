@@ -0,0 +1,243 @@
+# wildfire_agent/ledger.py
+"""
+Streaming loader for real wildfire cost ledgers (CSV or Parquet).
+
+Ledgers are read in fixed-size chunks and yielded as ``CostColumns``
+batches, so a multi-GB, multi-year ledger can be aggregated with memory
+bounded by the chunk size rather than the file size.
+
+Expected columns:
+  - region, category, cost   (required)
+  - hours, year              (optional; hours defaults to 0.0)
+"""
+
+from __future__ import annotations
+
+import io
+import logging
+import os
+from typing import Any, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .columnar import CODE_DTYPE, CostColumns
+
+logger = logging.getLogger("wildfire_cost_agent")
+
+DEFAULT_CHUNK_ROWS = 500_000
+
+LEDGER_COLUMNS = ["region", "category", "cost", "hours", "year"]
+
+# Bytes read per block when a CSV ledger is read by byte range.
+CSV_BLOCK_BYTES = 64 * 1024 * 1024
+
+PARQUET_EXTENSIONS = (".parquet", ".pq")
+
+
+def factorize_labels(values: pd.Series) -> Tuple[np.ndarray, List[Any]]:
+    """
+    CODE_DTYPE codes and first-seen label list of a chunk column; missing
+    labels (None / NaN) share one code and decode to None.
+    """
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    labels = [None if v != v else v for v in uniques.tolist()]
+    return codes.astype(CODE_DTYPE, copy=False), labels
+
+
+def _frame_to_columns(frame: pd.DataFrame, year: Optional[int]) -> CostColumns:
+    """Filter a ledger chunk by year and convert it to a column batch."""
+    if year is not None and "year" in frame.columns:
+        frame = frame[frame["year"] == year]
+
+    region_codes, regions = factorize_labels(frame["region"])
+    category_codes, categories = factorize_labels(frame["category"])
+    cost = frame["cost"].to_numpy(dtype=np.float64, na_value=0.0)
+    if "hours" in frame.columns:
+        hours = frame["hours"].to_numpy(dtype=np.float64, na_value=0.0)
+    else:
+        hours = np.zeros(len(frame), dtype=np.float64)
+
+    return CostColumns(region_codes, category_codes, cost, hours, regions, categories)
+
+
+def _iter_csv_frames(path: str, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    with pd.read_csv(
+        path,
+        chunksize=chunk_rows,
+        usecols=lambda c: c in LEDGER_COLUMNS,
+    ) as reader:
+        yield from reader
+
+
+def _iter_csv_range_frames(path: str, start: int, stop: int) -> Iterator[pd.DataFrame]:
+    """
+    Yield the CSV lines that begin in bytes [start, stop), in blocks of
+    about CSV_BLOCK_BYTES. Assumes no quoted newlines inside fields.
+    """
+    with open(path, "rb") as f:
+        header = f.readline()
+        if start > f.tell():
+            # Skip to the first line beginning at or after `start`.
+            f.seek(start - 1)
+            f.readline()
+        while f.tell() < stop:
+            block = f.read(min(CSV_BLOCK_BYTES, stop - f.tell()))
+            if not block:
+                break
+            if not block.endswith(b"\n"):
+                # Finish the line that straddles the block end.
+                block += f.readline()
+            yield pd.read_csv(
+                io.BytesIO(header + block),
+                usecols=lambda c: c in LEDGER_COLUMNS,
+            )
+
+
+def _iter_parquet_frames(
+    path: str,
+    chunk_rows: int,
+    row_groups: Optional[Sequence[int]] = None,
+) -> Iterator[pd.DataFrame]:
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError(
+            "Reading Parquet ledgers requires pyarrow (pip install pyarrow)."
+        ) from e
+
+    parquet_file = pq.ParquetFile(path)
+    columns: List[str] = [c for c in parquet_file.schema_arrow.names if c in LEDGER_COLUMNS]
+    for batch in parquet_file.iter_batches(
+        batch_size=chunk_rows, row_groups=row_groups, columns=columns
+    ):
+        yield batch.to_pandas()
+
+
+def iter_ledger_frames(
+    path: str,
+    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+    partition: Optional[Tuple[Any, ...]] = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    Yield a ledger file (or one ``partition_ledger`` partition of it) as
+    raw pandas chunks restricted to LEDGER_COLUMNS.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext in PARQUET_EXTENSIONS:
+        return _iter_parquet_frames(path, chunk_rows, partition)
+    if partition is not None:
+        return _iter_csv_range_frames(path, *partition)
+    return _iter_csv_frames(path, chunk_rows)
+
+
+def iter_ledger_chunks(
+    path: str,
+    year: Optional[int] = None,
+    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+    partition: Optional[Tuple[Any, ...]] = None,
+) -> Iterator[CostColumns]:
+    """
+    Yield a ledger file as ``CostColumns`` batches of at most ``chunk_rows``.
+
+    Parameters
+    ----------
+    path:
+        CSV (optionally compressed) or Parquet (``.parquet`` / ``.pq``) file.
+    year:
+        If given and the ledger has a ``year`` column, keep only that year.
+    chunk_rows:
+        Maximum number of source rows read per batch.
+    partition:
+        Optional slice of the file from ``partition_ledger``: a tuple of
+        Parquet row-group indices, or a (start, stop) CSV byte range.
+
+    Notes
+    -----
+    Region/category codes are local to each batch, and each batch carries
+    only its own labels; use ``columnar.aggregate_column_batches`` to
+    combine batches.
+    """
+    n_chunks = 0
+    n_rows = 0
+    for frame in iter_ledger_frames(path, chunk_rows, partition):
+        columns = _frame_to_columns(frame, year)
+        n_chunks += 1
+        n_rows += len(columns)
+        if len(columns):
+            yield columns
+
+    logger.info(
+        "Streamed ledger %s (chunks=%d, rows=%d, year=%s)",
+        path,
+        n_chunks,
+        n_rows,
+        year,
+    )
+
+
+def iter_ledger_year_chunks(
+    path: str,
+    years: Sequence[int],
+    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+) -> Iterator[Tuple[int, CostColumns]]:
+    """
+    Read a multi-year ledger once and yield (year, ``CostColumns``) batches
+    for each of `years` found in each chunk.
+
+    Equivalent to ``iter_ledger_chunks(path, year)`` for every year, but
+    with one pass over the file instead of one per year. A ledger without
+    a ``year`` column is not filtered (each year gets every row), as with
+    ``iter_ledger_chunks``.
+    """
+    wanted = set(years)
+    for frame in iter_ledger_frames(path, chunk_rows):
+        if "year" not in frame.columns:
+            for year in wanted:
+                yield year, _frame_to_columns(frame, None)
+            continue
+        frame = frame[frame["year"].isin(wanted)]
+        for year, group in frame.groupby("year", sort=False):
+            yield int(year), _frame_to_columns(group, None)
+
+
+def partition_ledger(path: str, n_parts: int, split_csv: bool = False) -> List[Tuple[Any, ...]]:
+    """
+    Split a ledger into at most `n_parts` partitions for parallel reads.
+
+    Parquet files split by row group (a single-row-group file gives one
+    partition). With `split_csv`, uncompressed CSV files split into byte
+    ranges that ``iter_ledger_chunks`` aligns to line starts; this is only
+    correct when no quoted field contains a newline, so it is off by
+    default. Other CSV files give one partition covering the whole file.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext in PARQUET_EXTENSIONS:
+        try:
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError(
+                "Reading Parquet ledgers requires pyarrow (pip install pyarrow)."
+            ) from e
+        n_groups = pq.ParquetFile(path).num_row_groups
+        n_parts = max(1, min(n_parts, n_groups))
+        return [
+            tuple(range(n_groups * i // n_parts, n_groups * (i + 1) // n_parts))
+            for i in range(n_parts)
+        ]
+
+    size = os.path.getsize(path)
+    if ext != ".csv" or n_parts <= 1 or not split_csv:
+        return [(0, size)]
+    return [(size * i // n_parts, size * (i + 1) // n_parts) for i in range(n_parts)]
+
+
+def ledger_fingerprint(path: str) -> str:
+    """
+    Cheap version fingerprint for a ledger file (path, size, mtime).
+
+    Used as the dataset part of aggregation cache keys; any rewrite of the
+    file changes the fingerprint.
+    """
+    st = os.stat(path)
+    return f"ledger:{os.path.abspath(path)}:{st.st_size}:{st.st_mtime_ns}"
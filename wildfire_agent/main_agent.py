@@ -1,14 +1,55 @@
 # wildfire_agent/main_agent.py
 
 import os
+import asyncio
+import functools
+import heapq
 import json
 import logging
-from typing import Any, Dict, List, Tuple
+import threading
+import uuid
+from typing import Any, Dict, List, Mapping, MutableMapping, Optional, Sequence, Tuple
 
-import requests
+import numpy as np
 from google.adk.agents import LlmAgent
 from google.adk.tools import FunctionTool
 
+from .cache import LRUCache
+from .column_cache import ColumnCache
+from .columnar import (
+    COLUMNAR_MIN_ROWS,
+    IncrementalAggregator,
+    aggregate_columns,
+    records_to_columns,
+)
+from .context import fit_token_budget
+from .cube import DEFAULT_DIMENSIONS as CUBE_DIMENSIONS, CostCube, normalize_filters
+from .insights import CostInsights, compute_insights
+from .jsonio import MAX_JSON_BYTES as _DEFAULT_MAX_JSON_BYTES, decode_rows
+from .metrics import (
+    REGISTRY as METRICS_REGISTRY,
+    enable_memory_tracing,
+    instrument_tool,
+    record_error,
+    record_span,
+    start_metrics_server,
+)
+from .ledger import DEFAULT_CHUNK_ROWS, ledger_fingerprint
+from .records import CostRecordTable, compact_records
+from .render import render_cost_table, rows_digest
+from .parallel import PARALLEL_MIN_BYTES, aggregate_cached_parallel, aggregate_ledger_parallel
+from .search import SEARCH_ENDPOINT as _DEFAULT_SEARCH_ENDPOINT, AsyncSearchClient, SearchCache
+from .session_store import SessionBackend, SessionStore, SqliteSessionStore
+from .years import (
+    MAX_YEARS,
+    aggregate_ledger_year,
+    aggregate_ledger_years,
+    aggregate_per_year,
+    ledger_path_for_year,
+    render_year_over_year,
+    year_over_year,
+)
+
 # -------------------------------------------------------------------
 # Logging / observability
 # -------------------------------------------------------------------
@@ -24,6 +65,39 @@ if not logger.handlers:
     logger.addHandler(_handler)
 logger.setLevel(logging.INFO)
 
+# Every registered tool runs in a timing span (metrics.py); per-tool
+# totals are kept in metrics.REGISTRY. Set WILDFIRE_METRICS_PORT to serve
+# them in Prometheus text format at /metrics, and
+# WILDFIRE_METRICS_TRACE_MEMORY=1 to also record peak allocation per call
+# (tracemalloc; slows the agent down). Both start when the agent first
+# runs (root_agent's before_agent_callback), not on import, so processes
+# that merely import this module never trace or bind the port. Shared
+# cache and session-store counters are added to the same output by
+# _collect_store_metrics.
+
+_observability_started = False
+_observability_lock = threading.Lock()
+
+
+def _start_observability(callback_context: Any = None) -> None:
+    """Start memory tracing / the metrics server once per process."""
+    global _observability_started
+    if _observability_started:
+        return
+    with _observability_lock:
+        if _observability_started:
+            return
+        _observability_started = True
+        if os.getenv("WILDFIRE_METRICS_TRACE_MEMORY", "") in ("1", "true", "yes"):
+            enable_memory_tracing()
+
+        port = int(os.getenv("WILDFIRE_METRICS_PORT", "0"))
+        if port:
+            try:
+                start_metrics_server(port, os.getenv("WILDFIRE_METRICS_HOST", "127.0.0.1"))
+            except OSError as e:
+                logger.warning("Could not start metrics server on port %d: %s", port, e)
+
 # -------------------------------------------------------------------
 # Environment / constants
 # -------------------------------------------------------------------
@@ -33,55 +107,416 @@ MODEL_NAME = "gemini-2.5-flash"
 # Search-specific env vars (support both ADK-style and fallback names)
 SEARCH_API_KEY = os.getenv("GOOGLE_SEARCH_API_KEY") or os.getenv("GOOGLE_API_KEY")
 SEARCH_CSE_ID = os.getenv("GOOGLE_SEARCH_CX") or os.getenv("GOOGLE_CSE_ID")
+# Override to point the search client at a local stub server.
+SEARCH_ENDPOINT = os.getenv("GOOGLE_SEARCH_ENDPOINT", _DEFAULT_SEARCH_ENDPOINT)
+SEARCH_MAX_CONCURRENCY = int(os.getenv("GOOGLE_SEARCH_MAX_CONCURRENCY", "4"))
+
+# Shared search response cache. Entries are fresh for
+# GOOGLE_SEARCH_CACHE_TTL seconds, then served stale (and refreshed in the
+# background) for GOOGLE_SEARCH_CACHE_STALE more seconds. Set
+# GOOGLE_SEARCH_CACHE_DIR to also persist entries on disk.
+SEARCH_CACHE = SearchCache(
+    ttl_seconds=float(os.getenv("GOOGLE_SEARCH_CACHE_TTL", "3600")),
+    stale_seconds=float(os.getenv("GOOGLE_SEARCH_CACHE_STALE", "86400")),
+    max_entries=int(os.getenv("GOOGLE_SEARCH_CACHE_SIZE", "256")),
+    cache_dir=os.getenv("GOOGLE_SEARCH_CACHE_DIR") or None,
+)
+
+# Largest JSON string accepted where tools take rows as JSON text.
+MAX_JSON_BYTES = int(os.getenv("WILDFIRE_MAX_JSON_BYTES", str(_DEFAULT_MAX_JSON_BYTES)))
+
+# Relative ledger paths passed to aggregate_cost_ledger resolve against this.
+LEDGER_DIR = os.getenv("WILDFIRE_LEDGER_DIR", "")
+
+# Worker processes for multi-year ledger aggregation (0 = one per CPU).
+YEAR_WORKERS = int(os.getenv("WILDFIRE_YEAR_WORKERS", "0")) or None
+
+# Worker processes for partitioned aggregation of one large ledger (0 = one
+# per CPU); ledgers under WILDFIRE_PARALLEL_MIN_BYTES are read in-process.
+AGG_WORKERS = int(os.getenv("WILDFIRE_AGG_WORKERS", "0")) or None
+AGG_PARALLEL_MIN_BYTES = int(os.getenv("WILDFIRE_PARALLEL_MIN_BYTES", str(PARALLEL_MIN_BYTES)))
+# Split large CSV ledgers into byte ranges as well as Parquet into row
+# groups. Only safe for CSV without newlines inside quoted fields.
+AGG_SPLIT_CSV = os.getenv("WILDFIRE_SPLIT_CSV", "") in ("1", "true", "yes")
+
+# Set WILDFIRE_COLUMN_CACHE_DIR to keep parsed ledgers as memory-mapped
+# column files (one entry per ledger version), so later loads - in any
+# process - skip parsing.
+_column_cache_dir = os.getenv("WILDFIRE_COLUMN_CACHE_DIR")
+COLUMN_CACHE = (
+    ColumnCache(
+        _column_cache_dir,
+        max_entries=int(os.getenv("WILDFIRE_COLUMN_CACHE_SIZE", "16")),
+    )
+    if _column_cache_dir
+    else None
+)
+
+# Bump when the synthetic rows in _mock_cost_records change, so cached
+# aggregations of the old rows are never served.
+MOCK_DATA_VERSION = "mock-v1"
+
+GROUP_BY = ("region", "category")
 
 # -------------------------------------------------------------------
-# Simple in-memory session state
+# Shared aggregation cache
 # -------------------------------------------------------------------
-# NOTE: This is process-local memory, good enough to demonstrate
-# "Sessions & Memory" for the capstone. In production, you would use
-# a persistent store or Memory Bank instead.
+# Process-wide (not per-session): keyed by (dataset fingerprint, year,
+# group-by columns). Cached lists are shared between sessions and must
+# not be mutated.
 
-SESSION_MEMORY: Dict[str, Dict[str, Any]] = {}
+AGGREGATION_CACHE = LRUCache(maxsize=int(os.getenv("WILDFIRE_AGG_CACHE_SIZE", "64")))
 
+# Rendered summaries, also process-wide: keyed by (rows content hash,
+# format, format options), so sessions asking for the same table share
+# one string. Sessions keep only a pointer in "last_summary".
 
-def _get_session_memory(session_id: str) -> Dict[str, Any]:
-    """Return (and initialise) a per-session memory dict."""
-    if session_id not in SESSION_MEMORY:
-        SESSION_MEMORY[session_id] = {
-            "last_year": None,
-            "last_raw_records": None,
-            "last_aggregated": None,
-            "last_compacted": None,
-            "last_summary": None,
-            "last_search_query": None,
-            "last_search_results": None,
-        }
-        logger.info("Created new session memory for session_id=%s", session_id)
-    return SESSION_MEMORY[session_id]
+SUMMARY_CACHE = LRUCache(maxsize=int(os.getenv("WILDFIRE_SUMMARY_CACHE_SIZE", "256")))
+
+# -------------------------------------------------------------------
+# Session state
+# -------------------------------------------------------------------
+# WILDFIRE_SESSION_BACKEND selects the store:
+#   - "memory" (default): bounded process-local store. Sessions expire
+#     after WILDFIRE_SESSION_TTL seconds idle, and least-recently-used
+#     sessions are evicted past WILDFIRE_SESSION_MAX_ENTRIES sessions or
+#     WILDFIRE_SESSION_MAX_BYTES total.
+#   - "sqlite": persistent store at WILDFIRE_SESSION_DB, shared by all
+#     worker processes; slots are loaded lazily one at a time.
+# The store is built on first use, so importing this module opens no
+# database; SESSION_MEMORY resolves to it (module __getattr__).
+
+# Oldest dataset handles in a session are dropped beyond this count.
+MAX_DATASETS_PER_SESSION = 16
+
+
+def _new_session_slots(session_id: str) -> Dict[str, Any]:
+    """Initial slots for a new session."""
+    logger.info("Created new session memory for session_id=%s", session_id)
+    return {
+        "last_year": None,
+        "last_raw_records": None,
+        "last_aggregated": None,
+        "last_compacted": None,
+        "last_summary": None,
+        "last_search_query": None,
+        "last_search_results": None,
+        "incremental": None,
+        "incremental_seed": None,
+        "dataset_ids": [],
+    }
+
+
+def _make_session_backend() -> SessionBackend:
+    """Build the session store selected by WILDFIRE_SESSION_BACKEND."""
+    backend = os.getenv("WILDFIRE_SESSION_BACKEND", "memory").lower()
+    ttl_seconds = float(os.getenv("WILDFIRE_SESSION_TTL", "3600"))
+    if backend == "sqlite":
+        path = os.getenv("WILDFIRE_SESSION_DB", "wildfire_sessions.db")
+        logger.info("Using sqlite session backend (path=%s)", path)
+        return SqliteSessionStore(path, _new_session_slots, ttl_seconds=ttl_seconds)
+    if backend != "memory":
+        logger.warning("Unknown WILDFIRE_SESSION_BACKEND=%r; using memory", backend)
+    return SessionStore(
+        _new_session_slots,
+        ttl_seconds=ttl_seconds,
+        max_entries=int(os.getenv("WILDFIRE_SESSION_MAX_ENTRIES", "1000")),
+        max_bytes=int(os.getenv("WILDFIRE_SESSION_MAX_BYTES", str(256 * 1024 * 1024))),
+    )
+
+
+_session_backend: Optional[SessionBackend] = None
+_session_backend_lock = threading.Lock()
+
+
+def _get_session_backend() -> SessionBackend:
+    """The session store, built on first use."""
+    global _session_backend
+    if _session_backend is None:
+        with _session_backend_lock:
+            if _session_backend is None:
+                _session_backend = _make_session_backend()
+    return _session_backend
+
+
+def __getattr__(name: str) -> Any:
+    if name == "SESSION_MEMORY":
+        return _get_session_backend()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _get_session_memory(session_id: str) -> MutableMapping[str, Any]:
+    """Return (and initialise) a per-session memory mapping."""
+    return _get_session_backend().get(session_id)
+
+
+def _collect_store_metrics() -> List[Any]:
+    """Cache and session-store counters for /metrics (see metrics.register_collector)."""
+    caches = (("aggregation", AGGREGATION_CACHE.stats()), ("summary", SUMMARY_CACHE.stats()))
+    families = [
+        (
+            f"wildfire_cache_{counter}_total",
+            "counter",
+            f"Shared cache {counter}.",
+            [({"cache": name}, stats[counter]) for name, stats in caches],
+        )
+        for counter in ("hits", "misses", "evictions")
+    ]
+    families.append(
+        (
+            "wildfire_cache_entries",
+            "gauge",
+            "Entries in a shared cache.",
+            [({"cache": name}, stats["size"]) for name, stats in caches],
+        )
+    )
+    # Only report a store that exists: collecting must not open the
+    # sqlite database as a side effect. The counters are read directly
+    # rather than through stats(), which scans the sqlite tables.
+    backend = _session_backend
+    if backend is not None:
+        evictions = sorted(dict(backend.evictions).items())
+        families.append(
+            (
+                "wildfire_session_evictions_total",
+                "counter",
+                "Sessions evicted from the session store, by reason.",
+                [({"reason": reason}, count) for reason, count in evictions],
+            )
+        )
+    return families
+
+
+METRICS_REGISTRY.register_collector(_collect_store_metrics)
 
 
 # -------------------------------------------------------------------
-# Tool implementations
+# Dataset handles
 # -------------------------------------------------------------------
+# Tools hand the model a small handle ({"dataset_id": ..., "rows": ...})
+# instead of the rows themselves; the rows stay in session memory and the
+# next tool looks them up by id. This keeps raw records out of the model
+# context and out of tool-call arguments.
 
 
-def load_mock_wildfire_costs(
-    year: int = 2024,
-    session_id: str = "default",
-) -> List[Dict[str, Any]]:
+def _discard(mem: MutableMapping[str, Any], key: str) -> None:
+    """Delete a session slot if present, without reading its value."""
+    # pop() would load the value first, which for SQLite sessions means
+    # unpickling a whole stale dataset just to drop it.
+    try:
+        del mem[key]
+    except KeyError:
+        pass
+
+
+def _new_handle(
+    mem: MutableMapping[str, Any],
+    kind: str,
+    rows: List[Dict[str, Any]],
+    fingerprint: Optional[str] = None,
+    **meta: Any,
+) -> Dict[str, Any]:
     """
-    Load a small synthetic wildfire cost dataset for a given year.
+    Store rows under a fresh dataset id and return the handle.
 
-    Each record has:
-      - region: geographic region name
-      - category: 'aircraft', 'personnel', or 'equipment'
-      - cost: total cost in dollars
-      - hours: usage hours (0 where not tracked)
+    `fingerprint` identifies the dataset version for the aggregation cache;
+    it is kept server-side and not included in the handle. The dataset the
+    last summary points at is never pruned, so it can be re-rendered, and
+    neither is the running aggregation of ``append_cost_records``.
+    """
+    dataset_id = f"{kind}-{uuid.uuid4().hex[:8]}"
+    mem[f"dataset:{dataset_id}"] = rows
+    if fingerprint is not None:
+        mem[f"version:{dataset_id}"] = (fingerprint, meta.get("year"))
+
+    dataset_ids = mem["dataset_ids"] + [dataset_id]
+    kept = dataset_ids[-MAX_DATASETS_PER_SESSION:]
+    summary_ref = mem.get("last_summary")
+    pinned = {
+        summary_ref.get("dataset_id") if isinstance(summary_ref, dict) else None,
+        mem.get("incremental"),
+    }
+    for stale_id in dataset_ids[:-MAX_DATASETS_PER_SESSION]:
+        if stale_id in pinned:
+            kept.insert(0, stale_id)
+            continue
+        for slot in ("dataset", "version", "render", "insights", "digest"):
+            _discard(mem, f"{slot}:{stale_id}")
+    mem["dataset_ids"] = kept
 
-    Session / memory:
-      - Stores raw records and year in SESSION_MEMORY[session_id].
+    handle = {"dataset_id": dataset_id, "kind": kind, "rows": len(rows)}
+    handle.update(meta)
+    return handle
+
+
+def _reset_incremental(mem: MutableMapping[str, Any], handle: Dict[str, Any]) -> None:
     """
-    data: List[Dict[str, Any]] = [
+    Make `handle`'s dataset (raw records or a (region, category)
+    aggregation) the one `append_cost_records` applies deltas to; the
+    running aggregation is rebuilt from it on the next append.
+    """
+    mem["incremental"] = None
+    mem["incremental_seed"] = handle["dataset_id"]
+
+
+def _dataset_version(data: Any, mem: MutableMapping[str, Any]) -> Optional[Tuple[str, Any]]:
+    """Return the stored (fingerprint, year) if `data` is a handle or dataset id."""
+    if isinstance(data, dict):
+        data = data.get("dataset_id")
+    if isinstance(data, str):
+        return mem.get(f"version:{data}")
+    return None
+
+
+def _dataset_render_options(data: Any, mem: MutableMapping[str, Any]) -> Dict[str, Any]:
+    """Render options stored with a token-budgeted dataset, if any."""
+    if isinstance(data, dict):
+        data = data.get("dataset_id")
+    if isinstance(data, str):
+        return mem.get(f"render:{data}") or {}
+    return {}
+
+
+def _dataset_insights(data: Any, mem: MutableMapping[str, Any]) -> Optional[CostInsights]:
+    """Key insights stored with an aggregated/compacted dataset, if any."""
+    if isinstance(data, dict):
+        data = data.get("dataset_id")
+    if isinstance(data, str):
+        return mem.get(f"insights:{data}")
+    return None
+
+
+def _aggregation_insights(
+    aggregated: List[Dict[str, Any]],
+    version: Tuple[str, Any],
+) -> CostInsights:
+    """Key insights of a versioned aggregation, shared via AGGREGATION_CACHE."""
+    return AGGREGATION_CACHE.get_or_compute(
+        (*version, ("insights",) + GROUP_BY),
+        lambda: compute_insights(aggregated),
+    )
+
+
+_SUMMARY_RENDERERS = {
+    "table": render_cost_table,
+    "trend": render_year_over_year,
+}
+
+
+def _render_summary(
+    mem: MutableMapping[str, Any],
+    dataset_id: Optional[str],
+    rows: List[Dict[str, Any]],
+    fmt: str = "table",
+    *options: Any,
+) -> str:
+    """
+    Render `rows` with ``_SUMMARY_RENDERERS[fmt](rows, *options)`` through
+    SUMMARY_CACHE and make it this session's last summary.
+
+    The rows' content hash is memoized per dataset id. For rows stored
+    under `dataset_id`, "last_summary" holds only a pointer (cache key +
+    dataset id); other rows have no stored copy to re-render from, so
+    the string itself is kept.
+    """
+    digest = mem.get(f"digest:{dataset_id}") if dataset_id else None
+    if digest is None:
+        digest = rows_digest(rows)
+        if dataset_id:
+            mem[f"digest:{dataset_id}"] = digest
+    key = (digest, fmt) + options
+    summary = SUMMARY_CACHE.get_or_compute(
+        key, lambda: _SUMMARY_RENDERERS[fmt](rows, *options)
+    )
+    mem["last_summary"] = {"key": key, "dataset_id": dataset_id} if dataset_id else summary
+    return summary
+
+
+def _last_summary(mem: MutableMapping[str, Any]) -> Optional[str]:
+    """
+    Resolve the session's "last_summary" slot to text. Pointers whose
+    cache entry was evicted (or lives in another worker process) are
+    re-rendered from the stored dataset, which `_new_handle` keeps for as
+    long as the pointer refers to it.
+    """
+    ref = mem.get("last_summary")
+    if not isinstance(ref, dict):
+        return ref
+    key = ref["key"]
+    summary = SUMMARY_CACHE.get(key)
+    if summary is None:
+        rows = mem.get(f"dataset:{ref['dataset_id']}")
+        if rows is None:
+            return None
+        summary = SUMMARY_CACHE.get_or_compute(
+            key, lambda: _SUMMARY_RENDERERS[key[1]](rows, *key[2:])
+        )
+    return summary
+
+
+def _mock_fingerprint(year: int, filters: Optional[Dict[str, List[str]]] = None) -> str:
+    """Fingerprint of the (optionally filtered) synthetic dataset for `year`."""
+    canonical = json.dumps(
+        {k: sorted(v) for k, v in normalize_filters(filters).items()},
+        sort_keys=True,
+    )
+    return f"{MOCK_DATA_VERSION}:{year}:{canonical}"
+
+
+def _resolve_rows(
+    data: Any,
+    mem: MutableMapping[str, Any],
+    default_slot: Optional[str],
+) -> Optional[List[Dict[str, Any]]]:
+    """
+    Turn a tool argument into a list of rows.
+
+    Accepts a list of rows, a handle dict, a dataset id string, a JSON
+    string of rows, or None/"" (falls back to mem[default_slot], which
+    holds rows or a dataset id, or no rows without one). Returns None if
+    a dataset id is given but unknown in this session. The running
+    aggregation of ``append_cost_records`` is read as a sorted snapshot. JSON strings go through ``jsonio.decode_rows``
+    (orjson if installed, size limit MAX_JSON_BYTES, numeric fields
+    coerced).
+
+    Raises ValueError for anything else: malformed JSON, a dict that is
+    not a handle, or a list with non-object rows. Tools report it as an
+    error instead of raising.
+    """
+    if data is None or data == "":
+        data = mem.get(default_slot) if default_slot else None
+        if not isinstance(data, str):
+            return data or []
+
+    if isinstance(data, dict):
+        if "dataset_id" not in data:
+            raise ValueError("Expected a dataset handle with a dataset_id, not a single row.")
+        data = data["dataset_id"]
+
+    if isinstance(data, str):
+        if f"dataset:{data}" in mem:
+            rows = mem[f"dataset:{data}"]
+            return rows.snapshot() if isinstance(rows, IncrementalAggregator) else rows
+        if not data.lstrip().startswith("["):
+            return None
+        return decode_rows(data, MAX_JSON_BYTES)
+
+    if not isinstance(data, (list, tuple)):
+        raise ValueError(f"Expected a list of rows, got {type(data).__name__}.")
+    for i, row in enumerate(data):
+        if not isinstance(row, Mapping):
+            raise ValueError(f"Row {i} is not an object.")
+    return list(data)
+
+
+# -------------------------------------------------------------------
+# Tool implementations
+# -------------------------------------------------------------------
+
+
+def _mock_cost_records(year: int) -> List[Dict[str, Any]]:
+    """Return the synthetic cost records for `year` (same rows every year)."""
+    return [
         {"region": "South", "category": "aircraft", "cost": 176_870.51, "hours": 116.9},
         {"region": "Central", "category": "aircraft", "cost": 161_923.60, "hours": 102.7},
         {"region": "Northwest", "category": "aircraft", "cost": 154_527.82, "hours": 94.8},
@@ -96,97 +531,691 @@ def load_mock_wildfire_costs(
         {"region": "South", "category": "equipment", "cost": 49_164.94, "hours": 0.0},
     ]
 
+
+def load_mock_wildfire_costs(
+    year: int = 2024,
+    session_id: str = "default",
+) -> Dict[str, Any]:
+    """
+    Load a small synthetic wildfire cost dataset for a given year.
+
+    Each record has:
+      - region: geographic region name
+      - category: 'aircraft', 'personnel', or 'equipment'
+      - cost: total cost in dollars
+      - hours: usage hours (0 where not tracked)
+
+    Returns
+    -------
+    Dict[str, Any]:
+        Dataset handle (dataset_id, kind, rows, year). Pass the
+        dataset_id to `aggregate_costs`.
+
+    Session / memory:
+      - Stores raw records (compacted, see records.py) and year in
+        SESSION_MEMORY[session_id].
+    """
+    data = compact_records(_mock_cost_records(year))
+
     mem = _get_session_memory(session_id)
     mem["last_year"] = year
     mem["last_raw_records"] = data
+    handle = _new_handle(mem, "raw", data, _mock_fingerprint(year), year=year)
+    _reset_incremental(mem, handle)
 
     logger.info(
-        "Loaded mock wildfire costs for year=%s (records=%d, session_id=%s)",
+        "Loaded mock wildfire costs for year=%s (records=%d, dataset_id=%s, session_id=%s)",
         year,
         len(data),
+        handle["dataset_id"],
         session_id,
     )
-    return data
+    return handle
+
+
+def _aggregate_records_loop(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Dict-based (region, category) aggregation used for small inputs."""
+    totals: Dict[Tuple[str, str], Dict[str, Any]] = {}
+
+    for r in records:
+        region = r.get("region")
+        category = r.get("category")
+        cost = float(r.get("cost", 0.0))
+        hours = float(r.get("hours", 0.0))
+        key = (region, category)
+
+        if key not in totals:
+            totals[key] = {
+                "region": region,
+                "category": category,
+                "total_cost": 0.0,
+                "hours": 0.0,
+            }
+
+        totals[key]["total_cost"] += cost
+        totals[key]["hours"] += hours
+
+    aggregated_list = list(totals.values())
+    aggregated_list.sort(key=lambda x: x["total_cost"], reverse=True)
+    return aggregated_list
+
+
+def _aggregate_records(records: Sequence[Mapping[str, Any]]) -> List[Dict[str, Any]]:
+    """Aggregate by (region, category), picking the engine by input size."""
+    if isinstance(records, CostRecordTable):
+        return aggregate_columns(records.columns)
+    if len(records) >= COLUMNAR_MIN_ROWS:
+        return aggregate_columns(records_to_columns(records))
+    return _aggregate_records_loop(records)
 
 
 def aggregate_costs(
-    records: List[Dict[str, Any]],
+    records: Optional[Any] = None,
     session_id: str = "default",
-) -> List[Dict[str, Any]]:
+) -> Dict[str, Any]:
     """
     Aggregate wildfire costs by (region, category).
 
     Parameters
     ----------
     records:
-        List of records with keys: region, category, cost, hours.
+        A dataset_id returned by `load_mock_wildfire_costs` (preferred), or
+        a list of records with keys: region, category, cost, hours. If
+        omitted, the last loaded dataset in this session is used.
 
     Returns
     -------
-    List[Dict[str, Any]]:
-        One row per (region, category) with:
+    Dict[str, Any]:
+        Dataset handle (dataset_id, kind, rows) for the aggregated rows.
+        Each stored row has:
         - region
         - category
         - total_cost
         - hours  (summed)
 
+    Performance:
+      - Inputs with at least COLUMNAR_MIN_ROWS records go through the
+        vectorized NumPy engine in columnar.py; smaller inputs use the
+        plain dict loop below.
+      - Results for known datasets (loaded via a tool, passed by dataset_id)
+        are memoized in the process-wide AGGREGATION_CACHE, together with
+        their key insights (shares, top buckets, cost per hour).
+
     Session / memory:
       - Stores aggregated list in SESSION_MEMORY[session_id]["last_aggregated"].
     """
+    mem = _get_session_memory(session_id)
+    version = _dataset_version(records, mem)
+    try:
+        records = _resolve_rows(records, mem, "last_raw_records")
+    except ValueError as e:
+        logger.error("aggregate_costs got invalid records: %s", e)
+        return {"error": f"Could not parse cost records: {e}"}
+    if records is None:
+        logger.error("aggregate_costs got unknown dataset_id (session_id=%s)", session_id)
+        return {"error": "Unknown dataset_id; call load_mock_wildfire_costs first."}
+    record_span(rows_in=len(records))
+
     logger.info(
         "Aggregating costs (input_records=%d, session_id=%s)",
         len(records),
         session_id,
     )
 
-    totals: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    if version is not None:
+        aggregated_list = AGGREGATION_CACHE.get_or_compute(
+            (*version, GROUP_BY),
+            lambda: _aggregate_records(records),
+        )
+    else:
+        aggregated_list = _aggregate_records(records)
 
-    for r in records:
-        region = r.get("region")
-        category = r.get("category")
-        cost = float(r.get("cost", 0.0))
-        hours = float(r.get("hours", 0.0))
-        key = (region, category)
+    mem["last_aggregated"] = aggregated_list
+    handle = _new_handle(mem, "aggregated", aggregated_list)
+    _reset_incremental(mem, handle)
+    if version is not None:
+        mem[f"insights:{handle['dataset_id']}"] = _aggregation_insights(aggregated_list, version)
 
-        if key not in totals:
-            totals[key] = {
-                "region": region,
-                "category": category,
-                "total_cost": 0.0,
-                "hours": 0.0,
-            }
+    logger.info(
+        "Aggregation complete (groups=%d, dataset_id=%s, session_id=%s)",
+        len(aggregated_list),
+        handle["dataset_id"],
+        session_id,
+    )
+    return handle
+
+
+def _aggregate_ledger_file(path: str, fingerprint: str, year: Optional[int]) -> List[Dict[str, Any]]:
+    """Aggregate a ledger by (region, category), via the column cache if enabled."""
+    if COLUMN_CACHE is None:
+        return aggregate_ledger_parallel(
+            path,
+            year=year,
+            max_workers=AGG_WORKERS,
+            min_bytes=AGG_PARALLEL_MIN_BYTES,
+            split_csv=AGG_SPLIT_CSV,
+        )
+    cached = COLUMN_CACHE.get_or_build(fingerprint, path)
+    return aggregate_cached_parallel(cached, year, max_workers=AGG_WORKERS)
 
-        totals[key]["total_cost"] += cost
-        totals[key]["hours"] += hours
 
-    aggregated_list = list(totals.values())
-    aggregated_list.sort(key=lambda x: x["total_cost"], reverse=True)
+def aggregate_cost_ledger(
+    path: str,
+    year: Optional[int] = None,
+    session_id: str = "default",
+) -> Dict[str, Any]:
+    """
+    Stream a CSV/Parquet cost ledger from disk and aggregate it by
+    (region, category) without loading the whole file into memory.
+
+    Parameters
+    ----------
+    path:
+        Ledger file path; relative paths resolve against WILDFIRE_LEDGER_DIR.
+    year:
+        Optional year filter (requires a `year` column in the ledger).
+
+    Returns
+    -------
+    Dict[str, Any]:
+        Dataset handle for the aggregated rows, same as `aggregate_costs`.
+        Raw ledger rows never leave this function.
+
+    Performance:
+      - Ledgers of at least WILDFIRE_PARALLEL_MIN_BYTES are split into
+        partitions (Parquet row groups; CSV byte ranges only with
+        WILDFIRE_SPLIT_CSV=1) aggregated by WILDFIRE_AGG_WORKERS worker
+        processes, then merged.
+      - With WILDFIRE_COLUMN_CACHE_DIR set, the ledger is parsed once per
+        version into memory-mapped column files and later aggregations
+        (other years, other processes) read those instead.
+
+    Session / memory:
+      - Stores year and aggregated list in SESSION_MEMORY[session_id].
+    """
+    full_path = os.path.join(LEDGER_DIR, path) if LEDGER_DIR else path
+    logger.info(
+        "Aggregating cost ledger (path=%s, year=%s, chunk_rows=%d, session_id=%s)",
+        full_path,
+        year,
+        DEFAULT_CHUNK_ROWS,
+        session_id,
+    )
+
+    try:
+        fingerprint = ledger_fingerprint(full_path)
+        aggregated_list = AGGREGATION_CACHE.get_or_compute(
+            (fingerprint, year, GROUP_BY),
+            lambda: _aggregate_ledger_file(full_path, fingerprint, year),
+        )
+    except Exception as e:
+        logger.error("Failed to aggregate cost ledger %s: %s", full_path, e)
+        return {"error": f"Could not read cost ledger: {e}"}
 
     mem = _get_session_memory(session_id)
+    mem["last_year"] = year
     mem["last_aggregated"] = aggregated_list
+    handle = _new_handle(mem, "aggregated", aggregated_list, year=year)
+    _reset_incremental(mem, handle)
+    mem[f"insights:{handle['dataset_id']}"] = _aggregation_insights(
+        aggregated_list, (fingerprint, year)
+    )
 
     logger.info(
-        "Aggregation complete (groups=%d, session_id=%s)",
+        "Ledger aggregation complete (groups=%d, dataset_id=%s, session_id=%s)",
         len(aggregated_list),
+        handle["dataset_id"],
         session_id,
     )
-    return aggregated_list
+    return handle
 
 
-def compact_aggregated_costs(
+def load_years(
+    start_year: int,
+    end_year: int,
+    session_id: str = "default",
+) -> Dict[str, Any]:
+    """
+    Load the synthetic cost dataset for every year in [start_year, end_year].
+
+    Records are the same as `load_mock_wildfire_costs` plus a `year` field,
+    so the returned dataset can be sliced by year with `query_cost_cube`.
+
+    Returns
+    -------
+    Dict[str, Any]:
+        Dataset handle (dataset_id, kind, rows, years). At most MAX_YEARS
+        years can be loaded at once.
+    """
+    years = list(range(start_year, end_year + 1))
+    if not years:
+        return {"error": "end_year must not be before start_year."}
+    if len(years) > MAX_YEARS:
+        return {"error": f"At most {MAX_YEARS} years can be loaded in one call."}
+    data = compact_records(
+        dict(r, year=year) for year in years for r in _mock_cost_records(year)
+    )
+
+    mem = _get_session_memory(session_id)
+    mem["last_raw_records"] = data
+    fingerprint = f"{MOCK_DATA_VERSION}:{years[0]}-{years[-1]}"
+    handle = _new_handle(mem, "raw", data, fingerprint, years=[start_year, end_year])
+    _reset_incremental(mem, handle)
+
+    logger.info(
+        "Loaded mock wildfire costs for years=%s-%s (records=%d, dataset_id=%s, session_id=%s)",
+        start_year,
+        end_year,
+        len(data),
+        handle["dataset_id"],
+        session_id,
+    )
+    return handle
+
+
+def _aggregate_mock_year(year: int) -> List[Dict[str, Any]]:
+    """Aggregate the synthetic dataset for one year."""
+    return _aggregate_records(_mock_cost_records(year))
+
+
+def aggregate_years(
+    start_year: int,
+    end_year: int,
+    path: str = "",
+    session_id: str = "default",
+) -> str:
+    """
+    Year-over-year cost trend for [start_year, end_year] in one call.
+
+    Each year is aggregated by (region, category) independently; years not
+    already in the aggregation cache fan out across a process pool
+    (WILDFIRE_YEAR_WORKERS processes, default one per CPU). The per-year
+    results are combined into a markdown table with total cost, change vs.
+    the previous year, hours and per-category totals.
+
+    Parameters
+    ----------
+    path:
+        Optional cost ledger (CSV/Parquet), resolved like
+        `aggregate_cost_ledger`. Either one multi-year file with a `year`
+        column, or a per-year template such as "costs_{year}.parquet".
+        If omitted, the synthetic dataset is used.
+
+    Session / memory:
+      - Stores the year-over-year rows as a "trend" dataset handle and
+        points SESSION_MEMORY[session_id]["last_summary"] at the rendered
+        table in SUMMARY_CACHE.
+    """
+    years = list(range(start_year, end_year + 1))
+    if not years:
+        record_error()
+        return "end_year must not be before start_year."
+    if len(years) > MAX_YEARS:
+        record_error()
+        return f"At most {MAX_YEARS} years can be compared in one call."
+
+    logger.info(
+        "Aggregating years %s-%s (path=%s, session_id=%s)",
+        start_year,
+        end_year,
+        path or "<mock>",
+        session_id,
+    )
+
+    if path:
+        full_path = os.path.join(LEDGER_DIR, path) if LEDGER_DIR else path
+        try:
+            keys = {
+                year: (ledger_fingerprint(ledger_path_for_year(full_path, year)), year, GROUP_BY)
+                for year in years
+            }
+        except OSError as e:
+            logger.error("Failed to read cost ledger %s: %s", full_path, e)
+            record_error()
+            return f"Could not read cost ledger: {e}"
+        # One multi-year file is read once, here, rather than by every
+        # worker: into the column cache if enabled, else split by year.
+        shared_file = "{year}" not in full_path
+        aggregate_year = functools.partial(
+            aggregate_ledger_year, full_path, cache=COLUMN_CACHE
+        )
+        max_workers = YEAR_WORKERS
+    else:
+        keys = {year: (_mock_fingerprint(year), year, GROUP_BY) for year in years}
+        aggregate_year = _aggregate_mock_year
+        shared_file = False
+        # A synthetic year is a dozen rows: not worth a worker process.
+        max_workers = 1
+
+    per_year = {}
+    missing = []
+    for year in years:
+        cached = AGGREGATION_CACHE.get(keys[year])
+        if cached is None:
+            missing.append(year)
+        else:
+            per_year[year] = cached
+
+    if missing:
+        try:
+            if shared_file and COLUMN_CACHE is None:
+                computed = aggregate_ledger_years(full_path, missing)
+            else:
+                if shared_file:
+                    COLUMN_CACHE.get_or_build(keys[years[0]][0], full_path)
+                computed = aggregate_per_year(missing, aggregate_year, max_workers)
+        except Exception as e:
+            logger.error("Multi-year aggregation failed: %s", e)
+            record_error()
+            return f"Could not aggregate cost data: {e}"
+        for year, rows in computed.items():
+            AGGREGATION_CACHE.put(keys[year], rows)
+        per_year.update(computed)
+
+    trend = year_over_year(per_year)
+    record_span(rows_in=sum(len(rows) for rows in per_year.values()), rows_out=len(trend))
+
+    mem = _get_session_memory(session_id)
+    handle = _new_handle(mem, "trend", trend, years=[start_year, end_year])
+    final_summary = _render_summary(mem, handle["dataset_id"], trend, "trend")
+
+    logger.info(
+        "Multi-year aggregation complete (years=%d, computed=%d, session_id=%s)",
+        len(years),
+        len(missing),
+        session_id,
+    )
+    return final_summary
+
+
+def _compact_rows(
     aggregated: List[Dict[str, Any]],
+    max_rows: int,
+    include_remainder: bool = True,
+) -> List[Dict[str, Any]]:
+    """
+    Keep the `max_rows` highest-cost aggregated rows, sorted descending.
+
+    Uses partial selection instead of a full sort: np.argpartition for
+    large inputs, heapq.nlargest (O(n log k)) otherwise. With
+    `include_remainder`, everything cut off is summed into one extra
+    "Other" row (flagged `remainder: True`) so totals stay correct.
+    """
+    max_rows = max(max_rows, 0)
+    n = len(aggregated)
+    if n <= max_rows:
+        # Sort defensively in case the caller didn't.
+        return sorted(
+            aggregated,
+            key=lambda x: float(x.get("total_cost", 0.0)),
+            reverse=True,
+        )
+
+    if n >= COLUMNAR_MIN_ROWS:
+        costs = np.fromiter(
+            (float(r.get("total_cost", 0.0)) for r in aggregated),
+            dtype=np.float64,
+            count=n,
+        )
+        top_idx = np.argpartition(-costs, max_rows - 1)[:max_rows] if max_rows else []
+        top_idx = sorted(top_idx, key=lambda i: costs[i], reverse=True)
+        compacted = [aggregated[i] for i in top_idx]
+    else:
+        compacted = heapq.nlargest(
+            max_rows,
+            aggregated,
+            key=lambda x: float(x.get("total_cost", 0.0)),
+        )
+
+    if include_remainder:
+        kept_cost = sum(float(r.get("total_cost", 0.0)) for r in compacted)
+        kept_hours = sum(float(r.get("hours", 0.0)) for r in compacted)
+        compacted.append(
+            {
+                "region": "Other",
+                "category": f"{n - len(compacted)} smaller buckets",
+                "total_cost": sum(float(r.get("total_cost", 0.0)) for r in aggregated) - kept_cost,
+                "hours": sum(float(r.get("hours", 0.0)) for r in aggregated) - kept_hours,
+                "remainder": True,
+            }
+        )
+    return compacted
+
+
+def append_cost_records(
+    records: List[Dict[str, Any]],
+    retract: bool = False,
+    session_id: str = "default",
+) -> Dict[str, Any]:
+    """
+    Apply a delta of new (or retracted) cost lines to the session's
+    running aggregation, without re-aggregating the full dataset.
+
+    Intended for ops pipelines/dashboards that stream new fire cost lines
+    during an active season; cost is O(len(records)). Groups are only
+    sorted (and copied) when the aggregation is read by another tool.
+
+    Parameters
+    ----------
+    records:
+        Raw records (region, category, cost, hours) to add: a list, a JSON
+        string of records, or a raw dataset id.
+    retract:
+        If True, subtract these records instead (corrections/deletions).
+
+    Returns
+    -------
+    Dict[str, Any]:
+        Dataset handle for the running aggregation; every append returns
+        the same dataset_id, whose rows reflect all deltas so far. If some
+        retracted records match no existing (region, category) group, they
+        are ignored and listed under `unmatched`.
+
+    Session / memory:
+      - The running aggregator is stored as the dataset itself, and
+        SESSION_MEMORY[session_id]["incremental"] holds its dataset id.
+        On first use it is seeded from the session's active dataset: the
+        latest raw records or (region, category) aggregation produced by a
+        load/aggregate tool. Any of those tools starts a new running
+        aggregation.
+      - Points SESSION_MEMORY[session_id]["last_aggregated"] at it.
+      - The in-process store keeps the aggregator object and updates it in
+        place. The SQLite store persists slots by value, so there the
+        aggregator's groups are written back once per append.
+    """
+    mem = _get_session_memory(session_id)
+    try:
+        records = _resolve_rows(records, mem, None)
+    except ValueError as e:
+        logger.error("append_cost_records got invalid records: %s", e)
+        return {"error": f"Could not parse cost records: {e}"}
+    if records is None:
+        logger.error("append_cost_records got unknown dataset_id (session_id=%s)", session_id)
+        return {"error": "Unknown dataset_id; call load_mock_wildfire_costs first."}
+    live_id = mem["incremental"]
+    aggregator = mem.get(f"dataset:{live_id}") if live_id is not None else None
+    if aggregator is None:
+        live_id = None
+        aggregator = IncrementalAggregator()
+        seed_id = mem.get("incremental_seed")
+        if seed_id is not None:
+            seed = mem.get(f"dataset:{seed_id}")
+            if seed is None:
+                logger.error(
+                    "append_cost_records: dataset %s is gone (session_id=%s)",
+                    seed_id,
+                    session_id,
+                )
+                return {"error": "The active dataset expired; load or aggregate it again."}
+            if isinstance(seed, CostRecordTable):
+                aggregator.apply_columns(seed.columns)
+            elif seed_id.startswith("raw-"):
+                aggregator.apply(seed)
+            else:
+                aggregator = IncrementalAggregator(seed)
+
+    if len(records) >= COLUMNAR_MIN_ROWS:
+        unmatched = aggregator.apply_columns(records_to_columns(records), retract=retract)
+    else:
+        unmatched = aggregator.apply(records, retract=retract)
+
+    if live_id is None:
+        handle = _new_handle(mem, "aggregated", aggregator)
+        live_id = handle["dataset_id"]
+        mem["incremental"] = live_id
+        mem["last_aggregated"] = live_id
+    else:
+        # O(1) on the in-process store (re-accounts the slot size via
+        # the aggregator's nbytes); see the docstring for SQLite.
+        mem[f"dataset:{live_id}"] = aggregator
+        handle = {"dataset_id": live_id, "kind": "aggregated", "rows": len(aggregator)}
+    if unmatched:
+        logger.warning(
+            "Ignored retraction for %d unknown group(s) (session_id=%s)",
+            len(unmatched),
+            session_id,
+        )
+        handle["unmatched"] = [{"region": r, "category": c} for r, c in unmatched]
+
+    logger.info(
+        "Applied %s delta (records=%d, groups=%d, session_id=%s)",
+        "retraction" if retract else "append",
+        len(records),
+        len(aggregator),
+        session_id,
+    )
+    return handle
+
+
+def _get_cube(data: Any, mem: MutableMapping[str, Any]) -> Optional[CostCube]:
+    """
+    Return the rollup cube for a raw dataset (default: the last one loaded).
+
+    Cubes of fingerprinted datasets are built once and shared through
+    AGGREGATION_CACHE; others are built on demand.
+    """
+    if data is None or data == "":
+        raw_ids = [i for i in mem["dataset_ids"] if i.startswith("raw-")]
+        data = raw_ids[-1] if raw_ids else None
+    version = _dataset_version(data, mem)
+    records = _resolve_rows(data, mem, "last_raw_records")
+    if records is None:
+        return None
+    if version is None:
+        return CostCube.from_records(records, CUBE_DIMENSIONS)
+    return AGGREGATION_CACHE.get_or_compute(
+        (*version, ("cube",) + CUBE_DIMENSIONS),
+        lambda: CostCube.from_records(records, CUBE_DIMENSIONS),
+    )
+
+
+def query_cost_cube(
+    group_by: List[str],
+    filters: Optional[Dict[str, List[str]]] = None,
+    dataset_id: str = "",
+    session_id: str = "default",
+) -> Dict[str, Any]:
+    """
+    Answer drill-down / roll-up questions from a precomputed cost cube.
+
+    Every rollup level over the dataset's dimensions (region, category,
+    year, fire_id, month — whichever the records have) is materialized
+    once, so follow-up questions like "just by category", "drill into the
+    South region" or "per fire" are lookups rather than re-aggregations.
+
+    Parameters
+    ----------
+    group_by:
+        Dimensions to group by, e.g. ["category"] or ["region", "fire_id"].
+        An empty list gives the grand total.
+    filters:
+        Optional {dimension: allowed values}, e.g. {"region": ["South"]};
+        a single value ({"region": "South"}) is treated as a one-item list.
+    dataset_id:
+        Raw dataset handle from `load_mock_wildfire_costs`; defaults to the
+        last loaded dataset in this session.
+
+    Returns
+    -------
+    Dict[str, Any]:
+        Dataset handle for the result rows (pass it to `build_cost_table`),
+        with up to 10 rows included as `preview`.
+    """
+    mem = _get_session_memory(session_id)
+    try:
+        cube = _get_cube(dataset_id, mem)
+    except ValueError as e:
+        logger.error("query_cost_cube got invalid records: %s", e)
+        return {"error": f"Could not parse cost records: {e}"}
+    if cube is None:
+        logger.error("query_cost_cube got unknown dataset_id (session_id=%s)", session_id)
+        return {"error": "Unknown dataset_id; call load_mock_wildfire_costs first."}
+
+    try:
+        rows = cube.query(group_by, filters)
+    except ValueError as e:
+        logger.error("query_cost_cube got an unsupported query: %s", e)
+        return {"error": str(e)}
+    mem["last_aggregated"] = rows
+    handle = _new_handle(mem, "aggregated", rows, group_by=list(group_by))
+    if sorted(group_by) == sorted(GROUP_BY):
+        _reset_incremental(mem, handle)
+    handle["preview"] = rows[:10]
+
+    logger.info(
+        "Cube query (group_by=%s, filters=%s, rows=%d, session_id=%s)",
+        group_by,
+        filters,
+        len(rows),
+        session_id,
+    )
+    return handle
+
+
+def compact_aggregated_costs(
+    aggregated: Optional[Any] = None,
     max_rows: int = 6,
+    include_remainder: bool = True,
+    max_tokens: int = 0,
     session_id: str = "default",
-) -> List[Dict[str, Any]]:
+) -> Dict[str, Any]:
     """
     Context engineering helper: compact aggregated costs to the top N rows.
 
     This keeps only the highest-cost buckets so that downstream prompts
-    stay small in the context window.
+    stay small in the context window. With `include_remainder` (default),
+    the buckets that were cut are summed into one extra "Other" row so
+    overall totals stay correct.
+
+    If `max_tokens` > 0, `max_rows` is ignored and the compaction is sized
+    to a token budget instead: the number of rows, cost precision and
+    rollup level (category-only) are chosen so the `build_cost_table`
+    output fits in about `max_tokens` tokens. The chosen options are
+    returned in the handle and applied automatically by `build_cost_table`.
+
+    `aggregated` is a dataset_id from `aggregate_costs` (or a list of
+    aggregated rows); if omitted, the last aggregation is used. Returns a
+    dataset handle for the compacted rows.
 
     Session / memory:
       - Stores compacted list in SESSION_MEMORY[session_id]["last_compacted"].
     """
+    mem = _get_session_memory(session_id)
+    # Insights of the full aggregation still describe its compaction.
+    insights = _dataset_insights(aggregated, mem)
+    try:
+        aggregated = _resolve_rows(aggregated, mem, "last_aggregated")
+    except ValueError as e:
+        logger.error("compact_aggregated_costs got invalid rows: %s", e)
+        return {"error": f"Could not parse aggregated cost data: {e}"}
+    if aggregated is None:
+        logger.error(
+            "compact_aggregated_costs got unknown dataset_id (session_id=%s)",
+            session_id,
+        )
+        return {"error": "Unknown dataset_id; call aggregate_costs first."}
+    record_span(rows_in=len(aggregated))
+
     logger.info(
         "Compacting aggregated costs (input_rows=%d, max_rows=%d, session_id=%s)",
         len(aggregated),
@@ -194,98 +1223,220 @@ def compact_aggregated_costs(
         session_id,
     )
 
-    # Sort defensively in case the caller didn't.
-    sorted_rows = sorted(
-        aggregated,
-        key=lambda x: float(x.get("total_cost", 0.0)),
-        reverse=True,
-    )
-    compacted = sorted_rows[:max_rows]
+    render_options = None
+    if max_tokens > 0 and aggregated:
+        compacted, render_options = fit_token_budget(
+            aggregated,
+            max_tokens,
+            functools.partial(render_cost_table, insights=insights),
+            _compact_rows,
+        )
+    else:
+        compacted = _compact_rows(aggregated, max_rows, include_remainder)
 
-    mem = _get_session_memory(session_id)
     mem["last_compacted"] = compacted
+    if render_options is None:
+        handle = _new_handle(mem, "compacted", compacted)
+    else:
+        handle = _new_handle(mem, "compacted", compacted, **render_options)
+        mem[f"render:{handle['dataset_id']}"] = render_options
+    if insights is not None:
+        mem[f"insights:{handle['dataset_id']}"] = insights
 
     logger.info(
-        "Compaction complete (output_rows=%d, session_id=%s)",
+        "Compaction complete (output_rows=%d, dataset_id=%s, session_id=%s)",
         len(compacted),
+        handle["dataset_id"],
         session_id,
     )
-    return compacted
+    return handle
 
 
 def build_cost_table(
-    aggregated: Any,
+    aggregated: Optional[Any] = None,
+    page: int = 1,
+    page_size: int = 0,
     session_id: str = "default",
 ) -> str:
     """
     Build a markdown table + short narrative summary from aggregated costs.
 
+    The Key Insights (category shares, top buckets, regional concentration,
+    cost per hour) are computed from the data; for datasets produced by
+    the aggregation tools they come precomputed from the cache.
+
+    For large drill-downs, set `page_size` (e.g. 50) to render one page of
+    rows at a time; `page` is 1-based. Key insights always cover all rows.
+
     Context / memory:
-      - Accepts either a Python list or a JSON string of aggregated rows.
-      - Stores the final summary string in SESSION_MEMORY[session_id]["last_summary"].
+      - Accepts a dataset_id from `aggregate_costs` / `compact_aggregated_costs`
+        (preferred), a Python list, or a JSON string of aggregated rows. If
+        omitted, the last aggregation in this session is used.
+      - Rendered tables are cached process-wide in SUMMARY_CACHE, keyed by
+        the rows' content hash and the render options, so identical tables
+        requested by many sessions are rendered once.
+      - Points SESSION_MEMORY[session_id]["last_summary"] at the result.
     """
-    if isinstance(aggregated, str):
-        try:
-            aggregated = json.loads(aggregated)
-            logger.info(
-                "Parsed aggregated JSON string into %d rows (session_id=%s)",
-                len(aggregated),
-                session_id,
-            )
-        except Exception as e:
-            logger.error("Failed to parse aggregated JSON: %s", e)
-            return "Could not parse aggregated cost data."
+    mem = _get_session_memory(session_id)
+    render_options = _dataset_render_options(aggregated, mem)
+    insights = _dataset_insights(aggregated, mem)
+    dataset_id = aggregated.get("dataset_id") if isinstance(aggregated, dict) else aggregated
+    if not (isinstance(dataset_id, str) and f"dataset:{dataset_id}" in mem):
+        dataset_id = None
+    elif dataset_id == mem.get("incremental"):
+        # The running aggregation changes under its id: keep the rendered
+        # text rather than a pointer (and don't memoize its digest).
+        dataset_id = None
+    try:
+        aggregated = _resolve_rows(aggregated, mem, "last_aggregated")
+    except ValueError as e:
+        logger.error("Failed to parse aggregated rows: %s", e)
+        record_error()
+        return f"Could not parse aggregated cost data: {e}"
+    if aggregated is None:
+        logger.error("build_cost_table got unknown dataset_id (session_id=%s)", session_id)
+        record_error()
+        return "Unknown dataset_id; aggregate the cost data first."
 
     if not aggregated:
         logger.warning("build_cost_table called with empty data (session_id=%s)", session_id)
         return "No cost data available."
 
-    lines = ["Region | Category | Total Cost ($) | Hours", "---|---|---|---"]
+    offset, limit = 0, None
+    if page_size > 0:
+        offset, limit = (max(page, 1) - 1) * page_size, page_size
+    record_span(rows_in=len(aggregated), rows_out=len(range(len(aggregated))[offset:][:limit]))
+    final_summary = _render_summary(
+        mem,
+        dataset_id,
+        aggregated,
+        "table",
+        render_options.get("cost_decimals", 2),
+        offset,
+        limit,
+        insights,
+        render_options.get("insights_detail", "full"),
+    )
 
-    for row in aggregated:
-        region = row.get("region", "")
-        category = row.get("category", "")
-        total_cost = float(row.get("total_cost", 0.0))
-        hours = float(row.get("hours", 0.0))
-        lines.append(f"{region} | {category} | {total_cost:,.2f} | {hours:.1f}")
+    logger.info(
+        "Built cost table summary (rows=%d, summary_chars=%d, session_id=%s)",
+        len(aggregated),
+        len(final_summary),
+        session_id,
+    )
+    return final_summary
 
-    table_md = "\n".join(lines)
 
-    top = max(aggregated, key=lambda x: x["total_cost"])
-    top_region = top["region"]
-    top_category = top["category"]
-    top_cost = top["total_cost"]
+def _filter_records(
+    records: List[Dict[str, Any]],
+    filters: Optional[Dict[str, List[str]]],
+) -> List[Dict[str, Any]]:
+    """Keep records whose field values are in the allowed lists of `filters`."""
+    allowed = {field: set(values) for field, values in normalize_filters(filters).items()}
+    if not allowed:
+        return records
+    return [
+        r for r in records
+        if all(r.get(field) in values for field, values in allowed.items())
+    ]
 
-    aircraft_total = sum(
-        r["total_cost"] for r in aggregated if r["category"] == "aircraft"
-    )
-    personnel_total = sum(
-        r["total_cost"] for r in aggregated if r["category"] == "personnel"
-    )
-    equipment_total = sum(
-        r["total_cost"] for r in aggregated if r["category"] == "equipment"
+
+def summarize_costs(
+    year: int = 2024,
+    top_n: int = 0,
+    filters: Optional[Dict[str, List[str]]] = None,
+    max_tokens: int = 0,
+    session_id: str = "default",
+) -> str:
+    """
+    One-call wildfire cost summary: load → aggregate → compact → table.
+
+    Runs the whole pipeline in-process and returns the finished markdown
+    table plus key insights, so a standard summary costs a single tool call.
+
+    Parameters
+    ----------
+    year:
+        Year to summarize.
+    top_n:
+        If > 0, keep only the top N cost buckets (compaction).
+    filters:
+        Optional field filters, e.g. {"region": ["South"], "category":
+        ["aircraft", "personnel"]}. Records must match every given field.
+        A single value ({"region": "South"}) is treated as a one-item list.
+    max_tokens:
+        If > 0, size the output to about this many tokens (overrides top_n):
+        rows, cost precision and rollup level are chosen to fit.
+
+    Session / memory:
+      - Updates the same SESSION_MEMORY slots and dataset handles as the
+        individual tools, so follow-up calls (e.g. `compact_aggregated_costs`,
+        `get_last_summary`) keep working.
+    """
+    logger.info(
+        "Summarizing costs (year=%s, top_n=%d, filters=%s, session_id=%s)",
+        year,
+        top_n,
+        filters,
+        session_id,
     )
 
-    summary_lines = [
-        "Here's a summary of the wildfire costs based on the synthetic data:\n",
-        "**Key Insights:**",
-        f"- **Largest Single Bucket:** {top_region} – {top_category} at ${top_cost:,.2f}.",
-        f"- **By Category:** Aircraft (${aircraft_total:,.2f}), "
-        f"Personnel (${personnel_total:,.2f}), "
-        f"Equipment (${equipment_total:,.2f}).",
-        "- Aircraft is the dominant cost driver across regions, "
-        "with personnel generally higher than equipment.",
-    ]
+    fingerprint = _mock_fingerprint(year, filters)
+    records = compact_records(_filter_records(_mock_cost_records(year), filters))
+    aggregated = AGGREGATION_CACHE.get_or_compute(
+        (fingerprint, year, GROUP_BY),
+        lambda: _aggregate_records(records),
+    )
 
-    final_summary = table_md + "\n\n" + "\n".join(summary_lines)
+    insights = _aggregation_insights(aggregated, (fingerprint, year))
 
     mem = _get_session_memory(session_id)
-    mem["last_summary"] = final_summary
+    mem["last_year"] = year
+    mem["last_raw_records"] = records
+    mem["last_aggregated"] = aggregated
+    _new_handle(mem, "raw", records, fingerprint, year=year)
+    handle = _new_handle(mem, "aggregated", aggregated, year=year)
+    _reset_incremental(mem, handle)
+    mem[f"insights:{handle['dataset_id']}"] = insights
+
+    rows = aggregated
+    rows_id = handle["dataset_id"]
+    cost_decimals, insights_detail = 2, "full"
+    if max_tokens > 0 and aggregated:
+        rows, render_options = fit_token_budget(
+            aggregated,
+            max_tokens,
+            functools.partial(render_cost_table, insights=insights),
+            _compact_rows,
+        )
+        cost_decimals = render_options["cost_decimals"]
+        insights_detail = render_options["insights_detail"]
+        mem["last_compacted"] = rows
+        handle = _new_handle(mem, "compacted", rows, year=year)
+        rows_id = handle["dataset_id"]
+        mem[f"render:{rows_id}"] = render_options
+        mem[f"insights:{rows_id}"] = insights
+    elif top_n > 0:
+        rows = _compact_rows(aggregated, top_n)
+        mem["last_compacted"] = rows
+        handle = _new_handle(mem, "compacted", rows, year=year)
+        rows_id = handle["dataset_id"]
+        mem[f"insights:{rows_id}"] = insights
+
+    record_span(rows_in=len(records), rows_out=len(rows))
+    if not rows:
+        logger.warning("summarize_costs found no matching data (session_id=%s)", session_id)
+        return "No cost data available."
+
+    final_summary = _render_summary(
+        mem, rows_id, rows, "table", cost_decimals, 0, None, insights, insights_detail
+    )
 
     logger.info(
-        "Built cost table summary (rows=%d, summary_chars=%d, session_id=%s)",
+        "Summary pipeline complete (records=%d, groups=%d, rows=%d, session_id=%s)",
+        len(records),
         len(aggregated),
-        len(final_summary),
+        len(rows),
         session_id,
     )
     return final_summary
@@ -300,7 +1451,7 @@ def get_last_summary(session_id: str = "default") -> str:
     tool instead of recomputing everything.
     """
     mem = _get_session_memory(session_id)
-    summary = mem.get("last_summary")
+    summary = _last_summary(mem)
 
     if not summary:
         logger.info(
@@ -317,7 +1468,41 @@ def get_last_summary(session_id: str = "default") -> str:
     return summary
 
 
-def google_search(query: str, session_id: str = "default") -> str:
+_SEARCH_NOT_CONFIGURED = (
+    "Google Custom Search is not configured. "
+    "Set GOOGLE_SEARCH_API_KEY (or GOOGLE_API_KEY) and "
+    "GOOGLE_SEARCH_CX (or GOOGLE_CSE_ID) in wildfire_agent/.env."
+)
+
+_search_client: Optional[AsyncSearchClient] = None
+
+
+def _get_search_client() -> AsyncSearchClient:
+    """Return the shared pooled search client (created on first use)."""
+    global _search_client
+    if _search_client is None:
+        _search_client = AsyncSearchClient(
+            SEARCH_API_KEY,
+            SEARCH_CSE_ID,
+            endpoint=SEARCH_ENDPOINT,
+            max_concurrency=SEARCH_MAX_CONCURRENCY,
+            cache=SEARCH_CACHE,
+        )
+    return _search_client
+
+
+def _format_search_results(items: List[Dict[str, Any]]) -> str:
+    """Render the top search items as markdown bullets."""
+    bullets = []
+    for item in items[:3]:
+        title = item.get("title", "Untitled result")
+        snippet = item.get("snippet", "").replace("\n", " ").strip()
+        link = item.get("link", "")
+        bullets.append(f"- **{title}** – {snippet} ({link})")
+    return "\n".join(bullets)
+
+
+async def google_search(query: str, session_id: str = "default") -> str:
     """
     Call Google Custom Search to fetch top results and return a short summary.
 
@@ -325,6 +1510,10 @@ def google_search(query: str, session_id: str = "default") -> str:
       - GOOGLE_SEARCH_API_KEY (preferred) or GOOGLE_API_KEY
       - GOOGLE_SEARCH_CX (preferred) or GOOGLE_CSE_ID
 
+    Performance:
+      - Async: uses a shared keep-alive connection pool and does not block
+        the event loop; several calls may run in parallel.
+
     Observability:
       - Logs each query and whether it succeeded.
     Memory:
@@ -334,47 +1523,24 @@ def google_search(query: str, session_id: str = "default") -> str:
         logger.warning(
             "Google search missing credentials (session_id=%s)", session_id
         )
-        return (
-            "Google Custom Search is not configured. "
-            "Set GOOGLE_SEARCH_API_KEY (or GOOGLE_API_KEY) and "
-            "GOOGLE_SEARCH_CX (or GOOGLE_CSE_ID) in wildfire_agent/.env."
-        )
-
-    params = {
-        "key": SEARCH_API_KEY,
-        "cx": SEARCH_CSE_ID,
-        "q": query,
-        "num": 5,
-        "safe": "off",
-    }
+        record_error()
+        return _SEARCH_NOT_CONFIGURED
 
     logger.info("Calling Google Custom Search (query=%r, session_id=%s)", query, session_id)
 
     try:
-        resp = requests.get(
-            "https://www.googleapis.com/customsearch/v1",
-            params=params,
-            timeout=10,
-        )
-        resp.raise_for_status()
-        data = resp.json()
+        items = await _get_search_client().search(query)
     except Exception as e:
         logger.error("Error calling Google Custom Search: %s", e)
+        record_error()
         return f"Error calling Google Custom Search: {e}"
 
-    items = data.get("items", [])[:3]
     if not items:
         logger.info("Google search returned no items (session_id=%s)", session_id)
         return "No search results found."
 
-    bullets = []
-    for item in items:
-        title = item.get("title", "Untitled result")
-        snippet = item.get("snippet", "").replace("\n", " ").strip()
-        link = item.get("link", "")
-        bullets.append(f"- **{title}** – {snippet} ({link})")
-
-    result_text = "Top results from Google Search:\n\n" + "\n".join(bullets)
+    record_span(rows_out=len(items))
+    result_text = "Top results from Google Search:\n\n" + _format_search_results(items)
 
     mem = _get_session_memory(session_id)
     mem["last_search_query"] = query
@@ -382,7 +1548,71 @@ def google_search(query: str, session_id: str = "default") -> str:
 
     logger.info(
         "Google search succeeded (results=%d, session_id=%s)",
-        len(bullets),
+        min(len(items), 3),
+        session_id,
+    )
+    return result_text
+
+
+async def google_search_many(
+    queries: List[str],
+    session_id: str = "default",
+) -> str:
+    """
+    Run several Google Custom Search queries in parallel.
+
+    Use this when a comparison needs more than one search (e.g. aviation
+    spending and personnel spending); all queries are sent concurrently.
+    Returns one section of top results per query.
+
+    Memory:
+      - Stores the queries and combined result text in SESSION_MEMORY.
+    """
+    if not SEARCH_API_KEY or not SEARCH_CSE_ID:
+        logger.warning(
+            "Google search missing credentials (session_id=%s)", session_id
+        )
+        record_error()
+        return _SEARCH_NOT_CONFIGURED
+
+    logger.info(
+        "Calling Google Custom Search in parallel (queries=%d, session_id=%s)",
+        len(queries),
+        session_id,
+    )
+
+    results = await _get_search_client().search_many(queries)
+
+    sections = []
+    for query, result in zip(queries, results):
+        if isinstance(result, asyncio.CancelledError):
+            logger.warning("Google Custom Search was cancelled (query=%r)", query)
+            body = "Search was cancelled."
+        elif isinstance(result, BaseException):
+            logger.error("Error calling Google Custom Search (query=%r): %s", query, result)
+            body = f"Error calling Google Custom Search: {result}"
+        elif not result:
+            body = "No search results found."
+        else:
+            body = _format_search_results(result)
+        sections.append(f"Top results for {query!r}:\n\n{body}")
+
+    result_text = "\n\n".join(sections)
+    record_span(
+        rows_in=len(queries),
+        rows_out=sum(len(r) for r in results if not isinstance(r, BaseException)),
+    )
+    if any(isinstance(r, BaseException) for r in results):
+        record_error()
+
+    mem = _get_session_memory(session_id)
+    mem["last_search_query"] = "; ".join(queries)
+    mem["last_search_results"] = result_text
+
+    logger.info(
+        "Parallel Google search complete (queries=%d, failed=%d, session_id=%s)",
+        len(queries),
+        sum(isinstance(r, BaseException) for r in results),
         session_id,
     )
     return result_text
@@ -392,12 +1622,18 @@ def google_search(query: str, session_id: str = "default") -> str:
 # Wrap tools for ADK
 # -------------------------------------------------------------------
 
-load_mock_wildfire_costs_tool = FunctionTool(load_mock_wildfire_costs)
-aggregate_costs_tool = FunctionTool(aggregate_costs)
-compact_aggregated_costs_tool = FunctionTool(compact_aggregated_costs)
-build_cost_table_tool = FunctionTool(build_cost_table)
-get_last_summary_tool = FunctionTool(get_last_summary)
-google_search_tool = FunctionTool(google_search)
+load_mock_wildfire_costs_tool = FunctionTool(instrument_tool(load_mock_wildfire_costs))
+aggregate_costs_tool = FunctionTool(instrument_tool(aggregate_costs))
+aggregate_cost_ledger_tool = FunctionTool(instrument_tool(aggregate_cost_ledger))
+compact_aggregated_costs_tool = FunctionTool(instrument_tool(compact_aggregated_costs))
+build_cost_table_tool = FunctionTool(instrument_tool(build_cost_table))
+summarize_costs_tool = FunctionTool(instrument_tool(summarize_costs))
+query_cost_cube_tool = FunctionTool(instrument_tool(query_cost_cube))
+load_years_tool = FunctionTool(instrument_tool(load_years))
+aggregate_years_tool = FunctionTool(instrument_tool(aggregate_years))
+get_last_summary_tool = FunctionTool(instrument_tool(get_last_summary))
+google_search_tool = FunctionTool(instrument_tool(google_search))
+google_search_many_tool = FunctionTool(instrument_tool(google_search_many))
 
 # -------------------------------------------------------------------
 # Root agent
@@ -416,16 +1652,36 @@ root_agent = LlmAgent(
         "You are a wildfire cost analysis assistant.\n"
         "\n"
         "Core workflow:\n"
-        "- When the user asks for a wildfire cost summary for a year, first call\n"
+        "- When the user asks for a wildfire cost summary for a year, call\n"
+        "  `summarize_costs` once (set `top_n` for a compact view and `filters`\n"
+        "  to restrict regions/categories). It returns the finished table.\n"
+        "- For ad-hoc analysis, the individual tools are still available: call\n"
         "  `load_mock_wildfire_costs`, then `aggregate_costs`.\n"
+        "- Loading and aggregation tools return a small handle with a `dataset_id`\n"
+        "  instead of the rows. Pass that `dataset_id` string to the next tool;\n"
+        "  never copy rows into tool arguments yourself.\n"
+        "- If the user points at a real cost ledger file (CSV or Parquet), call\n"
+        "  `aggregate_cost_ledger` with its path instead; it streams the file and\n"
+        "  returns a handle to already-aggregated rows.\n"
         "- If the user only needs a high-level view or context is large, call\n"
-        "  `compact_aggregated_costs` to keep only the top buckets.\n"
+        "  `compact_aggregated_costs` to keep only the top buckets. Prefer passing\n"
+        "  `max_tokens` (e.g. 300) so the table is sized to a token budget.\n"
         "- Then call `build_cost_table` to present the results as a table plus insights.\n"
+        "- For follow-up drill-down or roll-up questions (by category only, one\n"
+        "  region, per fire, per year), call `query_cost_cube` instead of reloading\n"
+        "  and re-aggregating.\n"
+        "- For trend questions across several years, call `aggregate_years` once\n"
+        "  with the year range (and `path` for a real ledger) instead of loading\n"
+        "  each year separately. To drill into a multi-year dataset (e.g. by year\n"
+        "  and category), call `load_years` and pass its dataset_id to\n"
+        "  `query_cost_cube`.\n"
         "\n"
         "Real-world comparison:\n"
         "- If the user asks to compare with real-world trends or external data,\n"
         "  call `google_search` with an appropriate query and include those findings\n"
         "  after the synthetic summary.\n"
+        "- If you need several searches (e.g. aviation and personnel spending), call\n"
+        "  `google_search_many` once with all queries; they run in parallel.\n"
         "\n"
         "Session & memory:\n"
         "- Tools accept an optional `session_id`. Use the same session_id within a\n"
@@ -437,11 +1693,18 @@ root_agent = LlmAgent(
         "managers who want quick insight into cost drivers."
     ),
     tools=[
+        summarize_costs_tool,
         load_mock_wildfire_costs_tool,
         aggregate_costs_tool,
+        aggregate_cost_ledger_tool,
         compact_aggregated_costs_tool,
+        query_cost_cube_tool,
+        load_years_tool,
+        aggregate_years_tool,
         build_cost_table_tool,
         get_last_summary_tool,
         google_search_tool,
+        google_search_many_tool,
     ],
+    before_agent_callback=_start_observability,
 )
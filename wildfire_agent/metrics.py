@@ -0,0 +1,394 @@
+# wildfire_agent/metrics.py
+"""
+Per-tool timing spans and an in-process metrics registry.
+
+``instrument_tool`` wraps a tool function (sync or async) so each call
+runs in a span that records:
+
+  - wall time and CPU time of the calling thread (work done in worker
+    processes is not included; for async tools, CPU time also includes
+    other tasks interleaved on the event loop);
+  - input / output row counts;
+  - bytes of the serialized result;
+  - peak traced allocation, when memory tracing is enabled
+    (``enable_memory_tracing``; tracemalloc slows Python code noticeably,
+    so it is off by default). The tracemalloc peak is process-wide and
+    each span resets it when it starts, so it is only exact for calls
+    that do not overlap. With async tools interleaved on the event loop
+    (or tools running in several threads), a span's peak can include
+    another call's allocations, and a span starting mid-call hides the
+    earlier part of the other call's peak;
+  - whether the call failed: it raised, returned a dict with "error", or
+    flagged itself with ``record_error`` (tools that report errors as
+    text).
+
+Output rows are read from the result where possible (a handle's
+``rows``, a list's length). Anything only the tool knows, such as input
+rows or a text error, is added from inside it with ``record_span`` /
+``record_error``, which do nothing outside a span, so direct
+(uninstrumented) calls cost nothing extra.
+
+Finished spans are folded into ``REGISTRY``. ``MetricsRegistry.render_prometheus``
+renders it in the Prometheus text exposition format, and
+``start_metrics_server`` serves that at ``/metrics``. Counters kept
+elsewhere (cache hits, session evictions) are added to the same output
+by collectors registered with ``MetricsRegistry.register_collector``.
+"""
+
+from __future__ import annotations
+
+import bisect
+import contextvars
+import functools
+import inspect
+import logging
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .jsonio import dumps
+
+logger = logging.getLogger("wildfire_cost_agent")
+
+# Upper bounds (seconds) of the wall-time histogram buckets.
+WALL_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# One metric family from a collector: (name, type, help, samples), where
+# each sample is ({label: value}, number).
+Family = Tuple[str, str, str, List[Tuple[Dict[str, str], Any]]]
+
+
+class Span:
+    """Measurements of one tool call."""
+
+    __slots__ = (
+        "tool",
+        "wall_start",
+        "cpu_start",
+        "wall_seconds",
+        "cpu_seconds",
+        "rows_in",
+        "rows_out",
+        "bytes_out",
+        "mem_start",
+        "child_peak",
+        "peak_bytes",
+        "error",
+    )
+
+    def __init__(self, tool: str) -> None:
+        self.tool = tool
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.rows_in: Optional[int] = None
+        self.rows_out: Optional[int] = None
+        self.bytes_out: Optional[int] = None
+        self.mem_start = 0
+        self.child_peak = 0
+        self.peak_bytes: Optional[int] = None
+        self.error = False
+
+
+_CURRENT_SPAN: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar(
+    "wildfire_current_span", default=None
+)
+
+
+class _ToolStats:
+    __slots__ = (
+        "calls",
+        "errors",
+        "wall_seconds",
+        "cpu_seconds",
+        "rows_in",
+        "rows_out",
+        "bytes_out",
+        "peak_bytes",
+        "wall_buckets",
+    )
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.errors = 0
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.rows_in = 0
+        self.rows_out = 0
+        self.bytes_out = 0
+        self.peak_bytes = 0
+        # Non-cumulative counts per WALL_BUCKETS bound, plus +Inf.
+        self.wall_buckets = [0] * (len(WALL_BUCKETS) + 1)
+
+
+class MetricsRegistry:
+    """Thread-safe per-tool aggregates of finished spans."""
+
+    def __init__(self) -> None:
+        self._stats: Dict[str, _ToolStats] = {}
+        self._collectors: List[Callable[[], Iterable[Family]]] = []
+        self._lock = threading.Lock()
+
+    def register_collector(self, collector: Callable[[], Iterable[Family]]) -> None:
+        """
+        Add ``collector`` to the Prometheus output.
+
+        It is called on every ``render_prometheus`` (outside the registry
+        lock) and returns the families to append. A collector that raises
+        is logged and skipped.
+        """
+        with self._lock:
+            self._collectors.append(collector)
+
+    def observe(self, span: Span) -> None:
+        with self._lock:
+            stats = self._stats.get(span.tool)
+            if stats is None:
+                stats = self._stats[span.tool] = _ToolStats()
+            stats.calls += 1
+            stats.errors += span.error
+            stats.wall_seconds += span.wall_seconds
+            stats.cpu_seconds += span.cpu_seconds
+            stats.rows_in += span.rows_in or 0
+            stats.rows_out += span.rows_out or 0
+            stats.bytes_out += span.bytes_out or 0
+            if span.peak_bytes is not None:
+                stats.peak_bytes = max(stats.peak_bytes, span.peak_bytes)
+            stats.wall_buckets[bisect.bisect_left(WALL_BUCKETS, span.wall_seconds)] += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """{tool: {calls, errors, wall_seconds, ...}} of everything observed so far."""
+        with self._lock:
+            return {
+                tool: {name: getattr(stats, name) for name in _ToolStats.__slots__ if name != "wall_buckets"}
+                for tool, stats in self._stats.items()
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+    def render_prometheus(self) -> str:
+        """All tool metrics in the Prometheus text exposition format."""
+        with self._lock:
+            items: List[Tuple[str, _ToolStats]] = sorted(self._stats.items())
+            lines: List[str] = []
+
+            def family(name: str, kind: str, help_text: str, attr: str) -> None:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for tool, stats in items:
+                    lines.append(f'{name}{{tool="{_escape(tool)}"}} {_number(getattr(stats, attr))}')
+
+            family("wildfire_tool_calls_total", "counter", "Tool calls.", "calls")
+            family("wildfire_tool_errors_total", "counter", "Tool calls that raised or returned an error.", "errors")
+
+            name = "wildfire_tool_wall_seconds"
+            lines.append(f"# HELP {name} Tool call wall time in seconds.")
+            lines.append(f"# TYPE {name} histogram")
+            for tool, stats in items:
+                label = f'tool="{_escape(tool)}"'
+                cumulative = 0
+                for bound, count in zip(WALL_BUCKETS + (float("inf"),), stats.wall_buckets):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'{name}_bucket{{{label},le="{le}"}} {cumulative}')
+                lines.append(f"{name}_sum{{{label}}} {_number(stats.wall_seconds)}")
+                lines.append(f"{name}_count{{{label}}} {stats.calls}")
+
+            family("wildfire_tool_cpu_seconds_total", "counter", "CPU time of the calling thread in tool calls.", "cpu_seconds")
+            family("wildfire_tool_rows_in_total", "counter", "Rows passed into tools.", "rows_in")
+            family("wildfire_tool_rows_out_total", "counter", "Rows returned or rendered by tools.", "rows_out")
+            family("wildfire_tool_output_bytes_total", "counter", "Bytes of serialized tool results.", "bytes_out")
+            family("wildfire_tool_peak_alloc_bytes", "gauge", "Largest peak traced allocation of one tool call.", "peak_bytes")
+            collectors = list(self._collectors)
+
+        for collector in collectors:
+            try:
+                families = list(collector())
+            except Exception:
+                logger.exception("Metrics collector %r failed", collector)
+                continue
+            for name, kind, help_text, samples in families:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    label_text = ",".join(f'{key}="{_escape(str(val))}"' for key, val in labels.items())
+                    lines.append(f"{name}{{{label_text}}} {_number(value)}" if label_text else f"{name} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: Any) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+REGISTRY = MetricsRegistry()
+
+
+def enable_memory_tracing() -> None:
+    """Start tracemalloc so spans record peak allocation."""
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def record_span(
+    rows_in: Optional[int] = None,
+    rows_out: Optional[int] = None,
+) -> None:
+    """Set row counts on the current span; no-op outside a span."""
+    span = _CURRENT_SPAN.get()
+    if span is None:
+        return
+    if rows_in is not None:
+        span.rows_in = rows_in
+    if rows_out is not None:
+        span.rows_out = rows_out
+
+
+def record_error() -> None:
+    """Mark the current span as failed; no-op outside a span."""
+    span = _CURRENT_SPAN.get()
+    if span is not None:
+        span.error = True
+
+
+def _start(span: Span, parent: Optional[Span]) -> None:
+    if tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        # The parent's peak so far would be lost by the reset below. The
+        # reset is global: a concurrent (non-nested) span loses its peak
+        # so far too; see the module docstring.
+        if parent is not None:
+            parent.child_peak = max(parent.child_peak, peak)
+        tracemalloc.reset_peak()
+        span.mem_start = current
+    span.wall_start = time.perf_counter()
+    span.cpu_start = time.thread_time()
+
+
+def _finish(span: Span, parent: Optional[Span], result: Any, registry: MetricsRegistry) -> None:
+    span.wall_seconds = time.perf_counter() - span.wall_start
+    span.cpu_seconds = time.thread_time() - span.cpu_start
+    if tracemalloc.is_tracing():
+        peak = max(tracemalloc.get_traced_memory()[1], span.child_peak)
+        span.peak_bytes = max(peak - span.mem_start, 0)
+        if parent is not None:
+            parent.child_peak = max(parent.child_peak, peak)
+
+    if isinstance(result, dict) and "error" in result:
+        span.error = True
+    if span.rows_out is None:
+        if isinstance(result, dict) and isinstance(result.get("rows"), int):
+            span.rows_out = result["rows"]
+        elif isinstance(result, list):
+            span.rows_out = len(result)
+    if result is not None:
+        try:
+            text = result if isinstance(result, str) else dumps(result)
+            span.bytes_out = len(text.encode("utf-8"))
+        except (TypeError, ValueError):
+            span.bytes_out = None
+
+    registry.observe(span)
+    logger.debug(
+        "Tool span %s: wall=%.4fs cpu=%.4fs rows_in=%s rows_out=%s bytes=%s peak=%s error=%s",
+        span.tool,
+        span.wall_seconds,
+        span.cpu_seconds,
+        span.rows_in,
+        span.rows_out,
+        span.bytes_out,
+        span.peak_bytes,
+        span.error,
+    )
+
+
+def instrument_tool(
+    func: Callable[..., Any],
+    registry: MetricsRegistry = REGISTRY,
+) -> Callable[..., Any]:
+    """
+    Wrap a tool so every call is measured in a span.
+
+    The wrapper keeps the tool's name, docstring and signature (and is a
+    coroutine function if the tool is), so it can be passed to
+    ``FunctionTool`` in place of the tool.
+    """
+    tool = func.__name__
+
+    if inspect.iscoroutinefunction(func):
+
+        @functools.wraps(func)
+        async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+            span = Span(tool)
+            parent = _CURRENT_SPAN.get()
+            token = _CURRENT_SPAN.set(span)
+            _start(span, parent)
+            result = None
+            try:
+                result = await func(*args, **kwargs)
+                return result
+            except BaseException:
+                span.error = True
+                raise
+            finally:
+                _CURRENT_SPAN.reset(token)
+                _finish(span, parent, result, registry)
+
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        span = Span(tool)
+        parent = _CURRENT_SPAN.get()
+        token = _CURRENT_SPAN.set(span)
+        _start(span, parent)
+        result = None
+        try:
+            result = func(*args, **kwargs)
+            return result
+        except BaseException:
+            span.error = True
+            raise
+        finally:
+            _CURRENT_SPAN.reset(token)
+            _finish(span, parent, result, registry)
+
+    return wrapper
+
+
+def start_metrics_server(
+    port: int,
+    host: str = "127.0.0.1",
+    registry: MetricsRegistry = REGISTRY,
+) -> ThreadingHTTPServer:
+    """Serve ``registry`` in Prometheus text format at /metrics from a daemon thread."""
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:  # noqa: N802 - http.server API
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", PROMETHEUS_CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args: Any) -> None:
+            # Scrapes are frequent; keep them out of the agent log.
+            pass
+
+    server = ThreadingHTTPServer((host, port), _Handler)
+    thread = threading.Thread(target=server.serve_forever, name="wildfire-metrics", daemon=True)
+    thread.start()
+    logger.info("Serving tool metrics at http://%s:%d/metrics", host, server.server_address[1])
+    return server
@@ -0,0 +1,296 @@
+# wildfire_agent/parallel.py
+"""
+Process-pool partitioned aggregation for very large inputs.
+
+Ledger files are split into partitions (Parquet row groups, or CSV byte
+ranges when enabled, see ``ledger.partition_ledger``); each worker
+process streams and aggregates its own partition and returns small partial (region,
+category) sums, which are merged in the parent. In-memory column
+batches are copied once into ``multiprocessing.shared_memory`` blocks
+that the workers attach to, so each worker reduces its slice without
+the arrays being pickled per task. Ledgers in the column cache need no
+copy at all: workers map the cached files themselves and share pages.
+
+Inputs below the size thresholds, or with a single worker available,
+fall back to the single-process path.
+
+All of it runs on one process pool, created on first use and reused
+(``process_pool`` / ``pool_map``). Workers start with ``forkserver``
+(``spawn`` where it is not available) rather than ``fork``: the agent
+process runs threads (the ADK runtime, search clients, the metrics
+server), and forking it can copy locks held by those threads into the
+child. The fork server preloads this module and ``years``, so workers
+start without re-importing NumPy / pandas; neither pulls in
+``main_agent``.
+"""
+
+from __future__ import annotations
+
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .column_cache import CachedColumns, aggregate_cached
+from .columnar import (
+    CostColumns,
+    aggregate_column_batches,
+    aggregate_columns,
+    merge_aggregations,
+)
+from .ledger import DEFAULT_CHUNK_ROWS, iter_ledger_chunks, partition_ledger
+
+logger = logging.getLogger("wildfire_cost_agent")
+
+# Below these sizes, process start-up and merging cost more than they save.
+PARALLEL_MIN_BYTES = 256 * 1024 * 1024
+PARALLEL_MIN_ROWS = 10_000_000
+
+# Worker start method; never "fork" (see the module docstring).
+POOL_START_METHOD = (
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
+# Modules the fork server imports once, before forking any worker.
+_FORKSERVER_PRELOAD = ["__main__", "wildfire_agent.parallel", "wildfire_agent.years"]
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+_COLUMN_FIELDS = ("region_codes", "category_codes", "cost", "hours")
+
+# (shared memory name, dtype str, length) per column field.
+_SharedSpec = Dict[str, Tuple[str, str, int]]
+
+
+def _resolve_workers(max_workers: Optional[int]) -> int:
+    return max_workers or os.cpu_count() or 1
+
+
+def process_pool(max_workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """
+    The shared process pool, with at least `max_workers` workers (default
+    one per CPU).
+
+    Created on first use and kept for later calls. A request for more
+    workers replaces it; the old pool finishes its queued tasks and exits.
+    Callers must not shut the pool down.
+    """
+    global _pool, _pool_workers
+    workers = _resolve_workers(max_workers)
+    with _pool_lock:
+        if _pool is None or workers > _pool_workers:
+            context = multiprocessing.get_context(POOL_START_METHOD)
+            if POOL_START_METHOD == "forkserver":
+                context.set_forkserver_preload(_FORKSERVER_PRELOAD)
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+            _pool_workers = workers
+        return _pool
+
+
+def shutdown_pool() -> None:
+    """Shut the shared pool down; the next ``process_pool`` call starts a new one."""
+    global _pool, _pool_workers
+    with _pool_lock:
+        pool, _pool, _pool_workers = _pool, None, 0
+    if pool is not None:
+        pool.shutdown(wait=True)
+
+
+def pool_map(fn: Callable[..., Any], *iterables: Iterable[Any], max_workers: int) -> List[Any]:
+    """
+    ``list(process_pool(max_workers).map(fn, *iterables))``.
+
+    Callers submit at most `max_workers` tasks, so a larger shared pool
+    never runs more of them at once. A pool broken by a dead worker is
+    discarded before the error propagates, so the next call gets a fresh
+    one.
+    """
+    global _pool, _pool_workers
+    pool = process_pool(max_workers)
+    try:
+        return list(pool.map(fn, *iterables))
+    except BrokenProcessPool:
+        with _pool_lock:
+            if _pool is pool:
+                _pool, _pool_workers = None, 0
+        raise
+
+
+def _aggregate_ledger_partition(
+    path: str,
+    year: Optional[int],
+    chunk_rows: int,
+    partition: Tuple[Any, ...],
+) -> List[Dict[str, Any]]:
+    """Worker: stream and aggregate one ledger partition."""
+    return aggregate_column_batches(
+        iter_ledger_chunks(path, year=year, chunk_rows=chunk_rows, partition=partition)
+    )
+
+
+def aggregate_ledger_parallel(
+    path: str,
+    year: Optional[int] = None,
+    max_workers: Optional[int] = None,
+    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+    min_bytes: int = PARALLEL_MIN_BYTES,
+    split_csv: bool = False,
+) -> List[Dict[str, Any]]:
+    """
+    Aggregate a ledger file by (region, category) across worker processes.
+
+    Same result as ``aggregate_column_batches(iter_ledger_chunks(path,
+    year))``. Files smaller than `min_bytes`, files that cannot be split
+    (one Parquet row group, compressed CSV, or any CSV unless `split_csv`
+    is set; see ``ledger.partition_ledger``) and ``max_workers=1`` run
+    in the calling process.
+    """
+    workers = _resolve_workers(max_workers)
+    partitions = (
+        partition_ledger(path, workers, split_csv=split_csv)
+        if workers > 1 and os.path.getsize(path) >= min_bytes
+        else []
+    )
+    if len(partitions) <= 1:
+        return aggregate_column_batches(
+            iter_ledger_chunks(path, year=year, chunk_rows=chunk_rows)
+        )
+
+    logger.info(
+        "Aggregating ledger %s across %d worker processes (partitions=%d)",
+        path,
+        min(workers, len(partitions)),
+        len(partitions),
+    )
+    partials = pool_map(
+        _aggregate_ledger_partition,
+        [path] * len(partitions),
+        [year] * len(partitions),
+        [chunk_rows] * len(partitions),
+        partitions,
+        max_workers=min(workers, len(partitions)),
+    )
+    return merge_aggregations(partials)
+
+
+def _attach(spec: _SharedSpec) -> Tuple[List[shared_memory.SharedMemory], Dict[str, np.ndarray]]:
+    """Map the shared column blocks described by `spec` as NumPy arrays."""
+    blocks = []
+    arrays = {}
+    for field, (name, dtype, length) in spec.items():
+        block = shared_memory.SharedMemory(name=name)
+        blocks.append(block)
+        arrays[field] = np.ndarray((length,), dtype=np.dtype(dtype), buffer=block.buf)
+    return blocks, arrays
+
+
+def _aggregate_shared_slice(
+    spec: _SharedSpec,
+    regions: List[Any],
+    categories: List[Any],
+    start: int,
+    stop: int,
+) -> List[Dict[str, Any]]:
+    """Worker: aggregate rows [start, stop) of the shared column blocks."""
+    blocks, arrays = _attach(spec)
+    try:
+        return aggregate_columns(
+            CostColumns(
+                arrays["region_codes"][start:stop],
+                arrays["category_codes"][start:stop],
+                arrays["cost"][start:stop],
+                arrays["hours"][start:stop],
+                regions,
+                categories,
+            )
+        )
+    finally:
+        # Views must be released before the blocks can be closed.
+        arrays.clear()
+        for block in blocks:
+            block.close()
+
+
+def aggregate_columns_parallel(
+    columns: CostColumns,
+    max_workers: Optional[int] = None,
+    min_rows: int = PARALLEL_MIN_ROWS,
+) -> List[Dict[str, Any]]:
+    """
+    Aggregate an in-memory column batch across worker processes.
+
+    Same result as ``aggregate_columns(columns)``. The columns are copied
+    once into shared memory; each worker reduces a contiguous row slice.
+    Batches smaller than `min_rows` run in the calling process.
+    """
+    workers = _resolve_workers(max_workers)
+    n = len(columns)
+    if workers <= 1 or n < min_rows:
+        return aggregate_columns(columns)
+
+    blocks: List[shared_memory.SharedMemory] = []
+    try:
+        spec: _SharedSpec = {}
+        for field in _COLUMN_FIELDS:
+            array = np.ascontiguousarray(getattr(columns, field))
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            blocks.append(block)
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+            spec[field] = (block.name, array.dtype.str, n)
+
+        bounds = [n * i // workers for i in range(workers + 1)]
+        logger.info("Aggregating %d rows across %d worker processes", n, workers)
+        partials = pool_map(
+            _aggregate_shared_slice,
+            [spec] * workers,
+            [columns.regions] * workers,
+            [columns.categories] * workers,
+            bounds[:-1],
+            bounds[1:],
+            max_workers=workers,
+        )
+        return merge_aggregations(partials)
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+
+def aggregate_cached_parallel(
+    cached: CachedColumns,
+    year: Optional[int] = None,
+    max_workers: Optional[int] = None,
+    min_rows: int = PARALLEL_MIN_ROWS,
+) -> List[Dict[str, Any]]:
+    """
+    Aggregate a column-cache entry across worker processes, each mapping
+    the cached files and reducing a contiguous row slice.
+
+    Entries smaller than `min_rows` are aggregated in the calling process.
+    """
+    workers = _resolve_workers(max_workers)
+    n = len(cached)
+    if workers <= 1 or n < min_rows:
+        return aggregate_columns(cached.select(year))
+
+    bounds = [n * i // workers for i in range(workers + 1)]
+    logger.info("Aggregating %d cached rows across %d worker processes", n, workers)
+    partials = pool_map(
+        aggregate_cached,
+        [cached.path] * workers,
+        [year] * workers,
+        bounds[:-1],
+        bounds[1:],
+        max_workers=workers,
+    )
+    return merge_aggregations(partials)
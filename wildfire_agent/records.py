@@ -0,0 +1,232 @@
+# wildfire_agent/records.py
+"""
+Compact containers for raw cost records.
+
+Records arrive as plain dicts with 4-6 keys each, a few hundred bytes
+per row. Datasets kept in session memory use one of two compact forms
+instead, both with a read-only dict-compatible interface (``r["cost"]``,
+``r.get("hours", 0.0)``, ``"year" in r``, ``dict(r)``) so existing
+row-at-a-time code keeps working:
+
+  - ``CostRecord``: one record as a ``__slots__`` object, for small sets.
+  - ``CostRecordTable``: struct-of-arrays for bulk sets. Region/category
+    are int32 codes into the table's own label lists, cost/hours are
+    float64, and any other fields (year, fire_id, ...) are
+    dictionary-encoded columns. The aggregation engine reads its
+    ``CostColumns`` directly, without per-row dicts.
+
+``compact_records`` picks the form by size.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Mapping, Sequence
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+from .columnar import COLUMNAR_MIN_ROWS, CostColumns, encode_labels, records_to_columns
+
+_BASE_FIELDS = ("region", "category", "cost", "hours")
+
+# Common optional fields with their own slot; any others go to a side dict.
+_OPTIONAL_FIELDS = ("year", "fire_id")
+
+_MISSING = object()
+
+
+class CostRecord(Mapping):
+    """
+    One cost record with a read-only mapping interface.
+
+    region, category, cost and hours are always present (cost/hours
+    default to 0.0); year and fire_id have their own (optional) slots, and
+    any other fields live in a small side dict.
+    """
+
+    __slots__ = ("region", "category", "cost", "hours", "year", "fire_id", "_extra")
+
+    def __init__(
+        self,
+        region: Any,
+        category: Any,
+        cost: float = 0.0,
+        hours: float = 0.0,
+        extra: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        self.region = region
+        self.category = category
+        self.cost = cost
+        self.hours = hours
+        extra = dict(extra) if extra else {}
+        self.year = extra.pop("year", _MISSING)
+        self.fire_id = extra.pop("fire_id", _MISSING)
+        self._extra = extra or None
+
+    @classmethod
+    def from_dict(cls, record: Dict[str, Any]) -> "CostRecord":
+        extra = {k: v for k, v in record.items() if k not in _BASE_FIELDS}
+        return cls(
+            record.get("region"),
+            record.get("category"),
+            record.get("cost", 0.0),
+            record.get("hours", 0.0),
+            extra,
+        )
+
+    def __getitem__(self, key: str) -> Any:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def get(self, key: str, default: Any = None) -> Any:
+        # Hot path for row loops; avoids Mapping.get's try/except.
+        if key in _BASE_FIELDS:
+            return getattr(self, key)
+        if key in _OPTIONAL_FIELDS:
+            value = getattr(self, key)
+            return default if value is _MISSING else value
+        if self._extra is not None:
+            return self._extra.get(key, default)
+        return default
+
+    def __iter__(self) -> Iterator[str]:
+        yield from _BASE_FIELDS
+        for key in _OPTIONAL_FIELDS:
+            if getattr(self, key) is not _MISSING:
+                yield key
+        if self._extra is not None:
+            yield from self._extra
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return f"CostRecord({dict(self)!r})"
+
+    def __reduce__(self) -> Any:
+        # Unset slots hold a module-level sentinel that pickle cannot
+        # preserve by identity, so round-trip through the dict form.
+        return (self.__class__.from_dict, (dict(self),))
+
+
+class CostRecordTable(Sequence):
+    """
+    Struct-of-arrays record set; indexing yields ``CostRecord`` rows.
+
+    Attributes
+    ----------
+    columns:
+        ``CostColumns`` with the region, category, cost and hours columns.
+    extra:
+        {field: (codes, labels)} for every other field, dictionary-encoded.
+    """
+
+    __slots__ = ("columns", "extra")
+
+    def __init__(
+        self,
+        columns: CostColumns,
+        extra: Optional[Dict[str, Tuple[np.ndarray, List[Any]]]] = None,
+    ) -> None:
+        self.columns = columns
+        self.extra = extra or {}
+
+    @classmethod
+    def from_records(cls, records: Sequence[Dict[str, Any]]) -> "CostRecordTable":
+        names: Dict[str, None] = {}
+        for r in records:
+            names.update(dict.fromkeys(r))
+        extra = {
+            name: encode_labels([r.get(name) for r in records])
+            for name in names
+            if name not in _BASE_FIELDS
+        }
+        return cls(records_to_columns(records), extra)
+
+    def __len__(self) -> int:
+        return len(self.columns)
+
+    def __getitem__(self, index: Union[int, slice]) -> Any:
+        if isinstance(index, slice):
+            c = self.columns
+            return CostRecordTable(
+                CostColumns(
+                    c.region_codes[index], c.category_codes[index],
+                    c.cost[index], c.hours[index],
+                    c.regions, c.categories,
+                ),
+                {name: (codes[index], labels) for name, (codes, labels) in self.extra.items()},
+            )
+        c = self.columns
+        i = range(len(c))[index]
+        extra = {name: labels[codes[i]] for name, (codes, labels) in self.extra.items()}
+        return CostRecord(
+            c.regions[c.region_codes[i]],
+            c.categories[c.category_codes[i]],
+            float(c.cost[i]),
+            float(c.hours[i]),
+            extra,
+        )
+
+    def __iter__(self) -> Iterator[CostRecord]:
+        c = self.columns
+        regions, categories = c.regions, c.categories
+        extra = [(name, codes.tolist(), labels) for name, (codes, labels) in self.extra.items()]
+        for i, (r, k, cost, hours) in enumerate(
+            zip(c.region_codes.tolist(), c.category_codes.tolist(), c.cost.tolist(), c.hours.tolist())
+        ):
+            yield CostRecord(
+                regions[r],
+                categories[k],
+                cost,
+                hours,
+                {name: labels[codes[i]] for name, codes, labels in extra},
+            )
+
+    def field(self, name: str) -> List[Any]:
+        """All values of one field, decoded (None where a record lacks it)."""
+        c = self.columns
+        if name == "region":
+            codes, labels = c.region_codes, c.regions
+        elif name == "category":
+            codes, labels = c.category_codes, c.categories
+        elif name in ("cost", "hours"):
+            return getattr(c, name).tolist()
+        elif name in self.extra:
+            codes, labels = self.extra[name]
+        else:
+            return [None] * len(c)
+        return [labels[k] for k in codes.tolist()]
+
+    def has_field(self, name: str) -> bool:
+        return name in _BASE_FIELDS or name in self.extra
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate size of the arrays (labels excluded)."""
+        c = self.columns
+        size = c.region_codes.nbytes + c.category_codes.nbytes + c.cost.nbytes + c.hours.nbytes
+        return size + sum(codes.nbytes for codes, _ in self.extra.values())
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """Expand to plain dicts (e.g. for JSON at the tool boundary)."""
+        return [dict(r) for r in self]
+
+
+RecordSet = Union[List[CostRecord], CostRecordTable]
+
+
+def compact_records(records: Iterable[Dict[str, Any]]) -> RecordSet:
+    """
+    Convert dict records to the compact form for their size: a list of
+    ``CostRecord`` below COLUMNAR_MIN_ROWS, otherwise a ``CostRecordTable``.
+    Already-compact inputs are returned unchanged.
+    """
+    if isinstance(records, CostRecordTable):
+        return records
+    records = records if isinstance(records, list) else list(records)
+    if len(records) >= COLUMNAR_MIN_ROWS:
+        return CostRecordTable.from_records(records)
+    return [r if isinstance(r, CostRecord) else CostRecord.from_dict(r) for r in records]
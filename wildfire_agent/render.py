@@ -0,0 +1,147 @@
+# wildfire_agent/render.py
+"""
+Markdown rendering of aggregated cost rows.
+
+Only the rows being shown are formatted, in blocks with one
+``str.format`` call per block instead of an f-string per row
+(``iter_row_blocks``, also used by ``tools.build_cost_table_text``), and
+``iter_cost_table`` yields the output block by block, so large
+drill-downs can be streamed or paged. The Key Insights come from
+``insights.compute_insights``; pass precomputed (cached) insights to skip
+that pass entirely.
+
+``rows_digest`` gives the content hash that rendered output is cached
+under (see ``main_agent.SUMMARY_CACHE``).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import pickle
+from itertools import chain
+from operator import itemgetter
+from typing import Any, Dict, Iterator, Optional, Sequence
+
+from .insights import CostInsights, compute_insights, render_insights
+
+# Rows formatted per yielded chunk.
+RENDER_BLOCK_ROWS = 2_000
+
+TABLE_HEADER = "Region | Category | Total Cost ($) | Hours\n---|---|---|---"
+
+
+def iter_row_blocks(
+    rows: Sequence[Dict[str, Any]],
+    row_fmt: str,
+    text_fields: Sequence[str],
+    number_fields: Sequence[str],
+    block_rows: int = RENDER_BLOCK_ROWS,
+) -> Iterator[str]:
+    """
+    Yield `rows` formatted with `row_fmt`, `block_rows` rows per chunk and
+    one ``str.format`` call per chunk.
+
+    `row_fmt` formats one row from its `text_fields` followed by its
+    `number_fields`. Blocks with a missing field or a number stored as a
+    string are redone field by field, with "" / 0.0 for missing fields
+    and numbers converted with ``float``.
+    """
+    getter = itemgetter(*text_fields, *number_fields)
+    for block_start in range(0, len(rows), block_rows):
+        block = rows[block_start:block_start + block_rows]
+        try:
+            text = (row_fmt * len(block)).format(*chain.from_iterable(map(getter, block)))
+        except (KeyError, TypeError, ValueError):
+            args = []
+            for row in block:
+                get = row.get
+                args += [get(f, "") for f in text_fields]
+                args += [float(get(f, 0.0)) for f in number_fields]
+            text = (row_fmt * len(block)).format(*args)
+        yield text
+
+
+def iter_cost_table(
+    aggregated: Sequence[Dict[str, Any]],
+    cost_decimals: int = 2,
+    offset: int = 0,
+    limit: Optional[int] = None,
+    block_rows: int = RENDER_BLOCK_ROWS,
+    insights: Optional[CostInsights] = None,
+    insights_detail: str = "full",
+) -> Iterator[str]:
+    """
+    Yield the markdown table + key insights for non-empty `aggregated`
+    in chunks; ``"".join(...)`` gives the full text.
+
+    Parameters
+    ----------
+    cost_decimals:
+        Dollar precision (2 = cents, 0 = whole dollars).
+    offset, limit:
+        Render only table rows [offset, offset + limit) and note the range
+        shown. Insights always cover every row.
+    block_rows:
+        Table rows per yielded chunk.
+    insights:
+        Precomputed insights for `aggregated` (or for the full aggregation
+        it was compacted from); computed here if omitted.
+    insights_detail:
+        ``insights.INSIGHTS_DETAIL_LEVELS`` entry; "none" renders the
+        table alone.
+    """
+    d = cost_decimals
+    n = len(aggregated)
+    offset = max(offset, 0)
+    stop = n if limit is None else min(n, offset + max(limit, 0))
+    row_fmt = f"\n{{}} | {{}} | {{:,.{d}f}} | {{:.1f}}"
+
+    yield TABLE_HEADER
+    yield from iter_row_blocks(
+        aggregated[offset:stop],
+        row_fmt,
+        ("region", "category"),
+        ("total_cost", "hours"),
+        block_rows,
+    )
+
+    if offset > 0 or stop < n:
+        yield f"\n\n_Showing rows {min(offset + 1, stop)}-{stop} of {n}._"
+
+    if insights_detail == "none":
+        return
+    if insights is None:
+        insights = compute_insights(aggregated)
+    yield "\n\n" + render_insights(insights, d, detail=insights_detail)
+
+
+def render_cost_table(
+    aggregated: Sequence[Dict[str, Any]],
+    cost_decimals: int = 2,
+    offset: int = 0,
+    limit: Optional[int] = None,
+    insights: Optional[CostInsights] = None,
+    insights_detail: str = "full",
+) -> str:
+    """Render ``iter_cost_table`` output as one string."""
+    return "".join(
+        iter_cost_table(
+            aggregated,
+            cost_decimals,
+            offset,
+            limit,
+            insights=insights,
+            insights_detail=insights_detail,
+        )
+    )
+
+
+def rows_digest(rows: Sequence[Dict[str, Any]]) -> str:
+    """
+    Content hash of rows for caching their rendered output.
+
+    Hashes the pickled rows, which is several times cheaper than
+    rendering them; equal rows with the same key order hash equal.
+    """
+    payload = pickle.dumps(rows if isinstance(rows, list) else list(rows), protocol=5)
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
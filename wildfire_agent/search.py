@@ -0,0 +1,352 @@
+# wildfire_agent/search.py
+"""
+Async Google Custom Search client.
+
+One pooled keep-alive ``httpx.AsyncClient`` is shared by all calls on an
+event loop, and a semaphore caps the number of in-flight requests, so
+several queries (e.g. aviation vs personnel spending) can fan out in
+parallel without blocking the agent's event loop. Requests are ordinary
+coroutines and can be cancelled by the caller.
+
+Responses can be cached in a shared ``SearchCache`` keyed on normalized
+query text, request parameters, search engine id and endpoint (memory,
+plus an optional on-disk directory), with a TTL and
+stale-while-revalidate: a stale hit is returned at once while a
+background request refreshes the entry. Empty result lists are not
+cached, so a query that found nothing is retried on the next call.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+import httpx
+
+from .jsonio import dumps, loads
+
+logger = logging.getLogger("wildfire_cost_agent")
+
+SEARCH_ENDPOINT = "https://www.googleapis.com/customsearch/v1"
+
+
+# Search operators that only work in upper case ("a OR b" != "a or b").
+_CASE_SENSITIVE = frozenset({"OR", "AND"})
+
+
+def normalize_query(query: str) -> str:
+    """
+    Case-fold and collapse whitespace in a query, and drop sentence
+    punctuation at its end ("?", ".", "!").
+
+    Everything else is kept: quotes, ``-term``, ``+``, ``site:`` and other
+    operators change what the search returns, so queries that differ in
+    them must not share a cache entry.
+    """
+    words = [w if w in _CASE_SENSITIVE else w.casefold() for w in query.split()]
+    return " ".join(words).rstrip("?.! ")
+
+
+class SearchCache:
+    """
+    Thread-safe TTL cache of search result items.
+
+    Parameters
+    ----------
+    ttl_seconds:
+        Age below which an entry is fresh.
+    stale_seconds:
+        Extra age during which an entry is still served, but flagged stale
+        so the caller can refresh it in the background.
+    max_entries:
+        In-memory (and on-disk) entry cap; least-recently-used entries go
+        first.
+    cache_dir:
+        Optional directory for a persistent copy of the entries, shared by
+        processes and restarts.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = 3600.0,
+        stale_seconds: float = 86400.0,
+        max_entries: int = 256,
+        cache_dir: Optional[str] = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.clock = clock
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[str, Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(query: str, **params: Any) -> str:
+        """Stable key for a query plus request parameters."""
+        payload = json.dumps(
+            {"q": normalize_query(query), **params},
+            sort_keys=True,
+        )
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Tuple[List[Dict[str, Any]], bool]]:
+        """
+        Look up `key`.
+
+        Returns (items, is_stale), or None if missing or older than
+        ttl_seconds + stale_seconds.
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                self._data.move_to_end(key)
+        if entry is None:
+            entry = self._read_disk(key)
+            if entry is not None:
+                self._put_memory(key, entry)
+
+        now = self.clock()
+        with self._lock:
+            if entry is None or now - entry[0] > self.ttl_seconds + self.stale_seconds:
+                self.misses += 1
+                return None
+            stale = now - entry[0] > self.ttl_seconds
+            if stale:
+                self.stale_hits += 1
+            else:
+                self.hits += 1
+        return entry[1], stale
+
+    def put(self, key: str, items: List[Dict[str, Any]]) -> None:
+        entry = (self.clock(), items)
+        self._put_memory(key, entry)
+        self._write_disk(key, entry)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+            }
+
+    def _put_memory(self, key: str, entry: Tuple[float, List[Dict[str, Any]]]) -> None:
+        with self._lock:
+            self._data[key] = entry
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _read_disk(self, key: str) -> Optional[Tuple[float, List[Dict[str, Any]]]]:
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._path(key), "rb") as f:
+                payload = loads(f.read())
+            return float(payload["stored_at"]), payload["items"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _write_disk(self, key: str, entry: Tuple[float, List[Dict[str, Any]]]) -> None:
+        if not self.cache_dir:
+            return
+        try:
+            tmp_path = f"{self._path(key)}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(dumps({"stored_at": entry[0], "items": entry[1]}))
+            os.replace(tmp_path, self._path(key))
+            self._prune_disk()
+        except OSError as e:
+            logger.warning("Could not write search cache entry: %s", e)
+
+    def _prune_disk(self) -> None:
+        files = [e for e in os.scandir(self.cache_dir) if e.name.endswith(".json")]
+        if len(files) <= self.max_entries:
+            return
+        files.sort(key=lambda e: e.stat().st_mtime)
+        for e in files[: len(files) - self.max_entries]:
+            try:
+                os.remove(e.path)
+            except OSError:
+                pass
+
+
+class AsyncSearchClient:
+    """
+    Pooled, concurrency-limited Custom Search client.
+
+    Parameters
+    ----------
+    api_key, cse_id:
+        Custom Search credentials.
+    endpoint:
+        Search URL; override to point at a local stub server.
+    max_concurrency:
+        Maximum number of requests in flight at once.
+    timeout:
+        Per-request timeout in seconds.
+    max_connections:
+        Size of the keep-alive connection pool.
+    cache:
+        Optional shared ``SearchCache``.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        cse_id: str,
+        endpoint: str = SEARCH_ENDPOINT,
+        max_concurrency: int = 4,
+        timeout: float = 10.0,
+        max_connections: int = 10,
+        cache: Optional[SearchCache] = None,
+    ) -> None:
+        self.api_key = api_key
+        self.cse_id = cse_id
+        self.endpoint = endpoint
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.cache = cache
+        self._refreshing: Set[str] = set()
+        self._background: Set[asyncio.Task] = set()
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def _ensure_client(self) -> httpx.AsyncClient:
+        # httpx clients and semaphores are bound to the loop they are used
+        # on; rebuild them if we are called from a different loop.
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop or self._client.is_closed:
+            if self._client is not None and not self._client.is_closed:
+                await self._close_stale(self._client, self._loop)
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        return self._client
+
+    @staticmethod
+    async def _close_stale(
+        client: httpx.AsyncClient,
+        loop: Optional[asyncio.AbstractEventLoop],
+    ) -> None:
+        """Close a client left over from another event loop."""
+        if loop is not None and loop.is_running():
+            # Still serving another thread: close it there.
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+            return
+        try:
+            await client.aclose()
+        except Exception as e:
+            # Its loop is gone, and with it the sockets' transports.
+            logger.debug("Could not close stale search client: %s", e)
+
+    async def search(self, query: str, num: int = 5) -> List[Dict[str, Any]]:
+        """
+        Return the raw result items for `query` (may be empty).
+
+        With a cache, fresh hits skip the network; stale hits are returned
+        immediately and refreshed by a background request.
+        """
+        if self.cache is None:
+            return await self._fetch(query, num)
+
+        # Clients with different engines or endpoints may share a cache.
+        key = self.cache.make_key(query, num=num, cx=self.cse_id, endpoint=self.endpoint)
+        cached = self.cache.get(key)
+        if cached is not None:
+            items, stale = cached
+            if stale and key not in self._refreshing:
+                self._refreshing.add(key)
+                task = asyncio.create_task(self._refresh(key, query, num))
+                self._background.add(task)
+                task.add_done_callback(self._background.discard)
+            return items
+
+        items = await self._fetch(query, num)
+        self._store(key, items)
+        return items
+
+    def _store(self, key: str, items: List[Dict[str, Any]]) -> None:
+        # An empty result is often transient (index lag, quota edge cases);
+        # caching it would hide real results for a whole TTL.
+        if items:
+            self.cache.put(key, items)
+
+    async def _refresh(self, key: str, query: str, num: int) -> None:
+        try:
+            self._store(key, await self._fetch(query, num))
+        except Exception as e:
+            logger.warning("Background search refresh failed (query=%r): %s", query, e)
+        finally:
+            self._refreshing.discard(key)
+
+    async def _fetch(self, query: str, num: int) -> List[Dict[str, Any]]:
+        client = await self._ensure_client()
+        params = {
+            "key": self.api_key,
+            "cx": self.cse_id,
+            "q": query,
+            "num": num,
+            "safe": "off",
+        }
+        async with self._semaphore:
+            resp = await client.get(self.endpoint, params=params)
+        if resp.is_error:
+            # Don't use raise_for_status(): its message embeds the request
+            # URL, which carries the API key.
+            raise httpx.HTTPStatusError(
+                f"Custom Search returned HTTP {resp.status_code}",
+                request=resp.request,
+                response=resp,
+            )
+        return loads(resp.content).get("items", [])
+
+    async def search_many(
+        self,
+        queries: List[str],
+        num: int = 5,
+    ) -> List[Any]:
+        """
+        Run several searches concurrently.
+
+        Returns one entry per query, in order: the item list, or the
+        exception raised for that query. A query whose request was
+        cancelled gives ``asyncio.CancelledError``, which is a
+        BaseException rather than an Exception.
+        """
+        return await asyncio.gather(
+            *(self.search(q, num=num) for q in queries),
+            return_exceptions=True,
+        )
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
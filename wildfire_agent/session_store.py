@@ -0,0 +1,470 @@
+# wildfire_agent/session_store.py
+"""
+Session stores backing main_agent._get_session_memory.
+
+A store maps session_id -> a mutable mapping of named slots
+(``last_summary``, ``dataset:<id>``, ...). Two backends implement the
+``SessionBackend`` interface:
+
+- ``SessionStore``: bounded in-process store. Sessions expire after a TTL,
+  and least-recently-used sessions are evicted once the store exceeds
+  ``max_entries`` or ``max_bytes``. Each session is a ``SessionEntry`` (a
+  dict) that re-accounts its approximate size whenever a slot is assigned.
+- ``SqliteSessionStore``: persistent store in a SQLite file (WAL mode),
+  shareable by several worker processes. Slots are read lazily, one row
+  at a time, so fetching ``last_summary`` never loads cached datasets.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import pickle
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, MutableMapping, Optional
+
+logger = logging.getLogger("wildfire_cost_agent")
+
+# Lists longer than this are sized from a sample of their first items.
+_SIZE_SAMPLE = 32
+
+
+def estimate_size(obj: Any) -> int:
+    """
+    Approximate deep size of `obj` in bytes.
+
+    Containers are walked recursively; long lists/tuples are extrapolated
+    from a sample, and NumPy arrays report their buffer size. Objects shared
+    between sessions (e.g. cached aggregations) are counted in each session.
+    """
+    nbytes = getattr(obj, "nbytes", None)
+    if isinstance(nbytes, int):
+        return sys.getsizeof(obj) + nbytes
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(estimate_size(k) + estimate_size(v) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple)) and obj:
+        sample = obj[:_SIZE_SAMPLE]
+        sampled = sum(estimate_size(x) for x in sample)
+        size += sampled * len(obj) // len(sample)
+    return size
+
+
+class SessionBackend:
+    """Interface shared by the session stores."""
+
+    # Sessions dropped so far, by reason ("ttl", "entries", "bytes").
+    evictions: Dict[str, int]
+
+    def get(self, session_id: str) -> MutableMapping[str, Any]:
+        """Return the session's slots, creating them if missing or expired."""
+        raise NotImplementedError
+
+    def pop(self, session_id: str) -> Any:
+        """Drop a session and all its slots."""
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of store size and counters."""
+        raise NotImplementedError
+
+    def __getitem__(self, session_id: str) -> MutableMapping[str, Any]:
+        return self.get(session_id)
+
+
+class SessionEntry(dict):
+    """Per-session slot dict that reports size changes to its store."""
+
+    def __init__(self, store: "SessionStore", session_id: str) -> None:
+        super().__init__()
+        self._store = store
+        self.session_id = session_id
+        self.slot_sizes: Dict[str, int] = {}
+        self.nbytes = 0
+        self.last_access = store.clock()
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        super().__setitem__(key, value)
+        self._resize(key, estimate_size(value))
+
+    def __delitem__(self, key: str) -> None:
+        super().__delitem__(key)
+        self._resize(key, 0)
+
+    def pop(self, key: str, *default: Any) -> Any:
+        value = super().pop(key, *default)
+        self._resize(key, 0)
+        return value
+
+    def update(self, *args: Any, **kwargs: Any) -> None:
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def setdefault(self, key: str, default: Any = None) -> Any:
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def _resize(self, key: str, new_size: int) -> None:
+        old_size = self.slot_sizes.pop(key, 0)
+        if new_size:
+            self.slot_sizes[key] = new_size
+        self.nbytes += new_size - old_size
+        self._store._account(self, new_size - old_size)
+
+
+class SessionStore(SessionBackend):
+    """
+    LRU session store with TTL, max-entries and max-bytes eviction.
+
+    Parameters
+    ----------
+    factory:
+        Called as ``factory(session_id)`` to build the initial slots of a
+        new session.
+    ttl_seconds:
+        Idle time after which a session expires (None disables expiry).
+    max_entries:
+        Maximum number of live sessions.
+    max_bytes:
+        Approximate upper bound on the summed size of all sessions.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[str], Dict[str, Any]],
+        ttl_seconds: Optional[float] = 3600.0,
+        max_entries: int = 1000,
+        max_bytes: int = 256 * 1024 * 1024,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.factory = factory
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.total_bytes = 0
+        self.created = 0
+        self.evictions = {"ttl": 0, "entries": 0, "bytes": 0}
+        self._entries: "OrderedDict[str, SessionEntry]" = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, session_id: str) -> bool:
+        with self._lock:
+            entry = self._entries.get(session_id)
+            return entry is not None and not self._expired(entry, self.clock())
+
+    def get(self, session_id: str) -> SessionEntry:
+        with self._lock:
+            now = self.clock()
+            self._expire(now)
+            entry = self._entries.get(session_id)
+            if entry is None:
+                entry = SessionEntry(self, session_id)
+                self._entries[session_id] = entry
+                entry.update(self.factory(session_id))
+                self.created += 1
+            self._entries.move_to_end(session_id)
+            entry.last_access = now
+            self._enforce_limits(protect=session_id)
+            return entry
+
+    def pop(self, session_id: str) -> Optional[SessionEntry]:
+        with self._lock:
+            entry = self._entries.pop(session_id, None)
+            if entry is not None:
+                self.total_bytes -= entry.nbytes
+            return entry
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.total_bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "created": self.created,
+                "evictions": dict(self.evictions),
+            }
+
+    # Internal -----------------------------------------------------------
+
+    def _account(self, entry: SessionEntry, delta: int) -> None:
+        with self._lock:
+            if self._entries.get(entry.session_id) is not entry:
+                return
+            self.total_bytes += delta
+            if delta > 0:
+                self._enforce_limits(protect=entry.session_id)
+
+    def _expired(self, entry: SessionEntry, now: float) -> bool:
+        return self.ttl_seconds is not None and now - entry.last_access > self.ttl_seconds
+
+    def _expire(self, now: float) -> None:
+        # Entries are in access order, so expired ones are at the front.
+        while self._entries:
+            session_id, entry = next(iter(self._entries.items()))
+            if not self._expired(entry, now):
+                break
+            self._evict(session_id, "ttl")
+
+    def _enforce_limits(self, protect: str) -> None:
+        # The session currently being served is never evicted, even if it
+        # alone exceeds max_bytes.
+        while len(self._entries) > self.max_entries:
+            if not self._evict_lru(protect, "entries"):
+                break
+        while self.total_bytes > self.max_bytes:
+            if not self._evict_lru(protect, "bytes"):
+                break
+
+    def _evict_lru(self, protect: str, reason: str) -> bool:
+        for session_id in self._entries:
+            if session_id != protect:
+                self._evict(session_id, reason)
+                return True
+        return False
+
+    def _evict(self, session_id: str, reason: str) -> None:
+        entry = self._entries.pop(session_id)
+        self.total_bytes -= entry.nbytes
+        self.evictions[reason] += 1
+        logger.info(
+            "Evicted session memory (session_id=%s, reason=%s, bytes=%d)",
+            session_id,
+            reason,
+            entry.nbytes,
+        )
+
+
+class SqliteSession(MutableMapping):
+    """Lazy slot mapping for one session in a ``SqliteSessionStore``."""
+
+    def __init__(self, store: "SqliteSessionStore", session_id: str) -> None:
+        self._store = store
+        self.session_id = session_id
+
+    def __getitem__(self, key: str) -> Any:
+        row = self._store._conn().execute(
+            "SELECT value FROM slots WHERE session_id = ? AND key = ?",
+            (self.session_id, key),
+        ).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return pickle.loads(row[0])
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        conn = self._store._conn()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO slots (session_id, key, value) VALUES (?, ?, ?)",
+                (self.session_id, key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL)),
+            )
+
+    def __delitem__(self, key: str) -> None:
+        conn = self._store._conn()
+        with conn:
+            cur = conn.execute(
+                "DELETE FROM slots WHERE session_id = ? AND key = ?",
+                (self.session_id, key),
+            )
+        if cur.rowcount == 0:
+            raise KeyError(key)
+
+    def pop(self, key: str, *default: Any) -> Any:
+        # One DELETE ... RETURNING instead of MutableMapping's read, then
+        # delete. Use ``del`` to drop a slot without unpickling it.
+        conn = self._store._conn()
+        with conn:
+            row = conn.execute(
+                "DELETE FROM slots WHERE session_id = ? AND key = ? RETURNING value",
+                (self.session_id, key),
+            ).fetchone()
+        if row is None:
+            if default:
+                return default[0]
+            raise KeyError(key)
+        return pickle.loads(row[0])
+
+    def __contains__(self, key: object) -> bool:
+        return self._store._conn().execute(
+            "SELECT 1 FROM slots WHERE session_id = ? AND key = ?",
+            (self.session_id, key),
+        ).fetchone() is not None
+
+    def __iter__(self) -> Iterator[str]:
+        rows = self._store._conn().execute(
+            "SELECT key FROM slots WHERE session_id = ?", (self.session_id,)
+        ).fetchall()
+        return iter([r[0] for r in rows])
+
+    def __len__(self) -> int:
+        return self._store._conn().execute(
+            "SELECT COUNT(*) FROM slots WHERE session_id = ?", (self.session_id,)
+        ).fetchone()[0]
+
+
+class SqliteSessionStore(SessionBackend):
+    """
+    Persistent session store in a SQLite database (WAL mode).
+
+    Several processes (e.g. multiple ``adk web`` workers) can share one
+    database file, so requests need no sticky sessions. Slot values are
+    pickled; reads fetch one slot at a time.
+
+    Parameters
+    ----------
+    path:
+        Database file path.
+    factory:
+        Called as ``factory(session_id)`` to build the initial slots of a
+        new session.
+    ttl_seconds:
+        Idle time after which a session expires (None disables expiry).
+    """
+
+    # Expired sessions are swept at most this often.
+    SWEEP_INTERVAL = 60.0
+
+    def __init__(
+        self,
+        path: str,
+        factory: Callable[[str], Dict[str, Any]],
+        ttl_seconds: Optional[float] = 3600.0,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.path = path
+        self.factory = factory
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self.created = 0
+        self.evictions = {"ttl": 0}
+        self._local = threading.local()
+        self._last_sweep = 0.0
+
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                " session_id TEXT PRIMARY KEY,"
+                " last_access REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS slots ("
+                " session_id TEXT NOT NULL"
+                "  REFERENCES sessions(session_id) ON DELETE CASCADE,"
+                " key TEXT NOT NULL,"
+                " value BLOB,"
+                " PRIMARY KEY (session_id, key))"
+            )
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread (and per process after a fork).
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30.0)
+            conn.execute("PRAGMA foreign_keys=ON")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def __len__(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def __contains__(self, session_id: str) -> bool:
+        row = self._conn().execute(
+            "SELECT last_access FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        return row is not None and not self._expired(row[0], self.clock())
+
+    def get(self, session_id: str) -> SqliteSession:
+        now = self.clock()
+        if now - self._last_sweep >= self.SWEEP_INTERVAL:
+            self._sweep(now)
+
+        conn = self._conn()
+        with conn:
+            # Take the write lock before reading, so two processes cannot
+            # both see a missing session and both try to create it.
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT last_access FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row is not None and self._expired(row[0], now):
+                conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+                self.evictions["ttl"] += 1
+                row = None
+            if row is None:
+                conn.execute(
+                    "INSERT INTO sessions (session_id, last_access) VALUES (?, ?)"
+                    " ON CONFLICT(session_id) DO UPDATE SET last_access = excluded.last_access",
+                    (session_id, now),
+                )
+                conn.executemany(
+                    "INSERT OR REPLACE INTO slots (session_id, key, value) VALUES (?, ?, ?)",
+                    [
+                        (session_id, k, pickle.dumps(v, pickle.HIGHEST_PROTOCOL))
+                        for k, v in self.factory(session_id).items()
+                    ],
+                )
+                self.created += 1
+            else:
+                conn.execute(
+                    "UPDATE sessions SET last_access = ? WHERE session_id = ?",
+                    (now, session_id),
+                )
+        return SqliteSession(self, session_id)
+
+    def pop(self, session_id: str) -> None:
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def clear(self) -> None:
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM sessions")
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._conn()
+        entries = conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        nbytes = conn.execute("SELECT COALESCE(SUM(LENGTH(value)), 0) FROM slots").fetchone()[0]
+        return {
+            "entries": entries,
+            "bytes": nbytes,
+            "path": self.path,
+            "created": self.created,
+            "evictions": dict(self.evictions),
+        }
+
+    def _expired(self, last_access: float, now: float) -> bool:
+        return self.ttl_seconds is not None and now - last_access > self.ttl_seconds
+
+    def _sweep(self, now: float) -> None:
+        self._last_sweep = now
+        if self.ttl_seconds is None:
+            return
+        conn = self._conn()
+        with conn:
+            cur = conn.execute(
+                "DELETE FROM sessions WHERE last_access < ?",
+                (now - self.ttl_seconds,),
+            )
+        if cur.rowcount:
+            self.evictions["ttl"] += cur.rowcount
+            logger.info("Expired %d sqlite sessions (path=%s)", cur.rowcount, self.path)
@@ -5,12 +5,133 @@ Custom tools for the Wildfire Cost Insights Agent.
 
 from __future__ import annotations
 
-from typing import List, Dict, Any
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
 import logging
-import random
+
+import numpy as np
+
+from .columnar import aggregate_columns
+from .records import CostRecordTable
+from .render import iter_row_blocks
 
 logger = logging.getLogger(__name__)
 
+REGIONS = ["Northwest", "Northeast", "Central", "South"]
+CATEGORIES = ["aircraft", "equipment", "personnel"]
+BASE_COSTS = {
+    "aircraft": 50_000,
+    "equipment": 20_000,
+    "personnel": 30_000,
+}
+
+# Distribution specs are (numpy Generator method, param1, param2), e.g.
+# ("uniform", low, high), ("normal", mean, sd), ("lognormal", mean, sigma).
+DEFAULT_COST_NOISE = ("uniform", 0.7, 1.3)
+DEFAULT_AIRCRAFT_HOURS = ("uniform", 10, 80)
+
+# ------------------------------
+# Vectorized mock data generator
+# ------------------------------
+
+def iter_mock_cost_chunks(
+    n_fires: int = 3,
+    years: Sequence[int] = (2024,),
+    regions: Sequence[str] = REGIONS,
+    categories: Sequence[str] = CATEGORIES,
+    base_costs: Optional[Dict[str, float]] = None,
+    cost_noise: Tuple[str, float, float] = DEFAULT_COST_NOISE,
+    aircraft_hours: Tuple[str, float, float] = DEFAULT_AIRCRAFT_HOURS,
+    seed: int = 42,
+    chunk_rows: Optional[int] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Generate years x regions x categories x n_fires mock cost rows as
+    NumPy column chunks.
+
+    Rows are laid out like the original nested loop (year, region,
+    category, fire). Each chunk is a dict of equal-length arrays:
+    year, region_code, category_code, fire_idx, cost, hours; plus the
+    ``regions`` / ``categories`` label lists. Randomness comes from a
+    local ``np.random.Generator`` (the global ``random`` module is never
+    touched), so output is reproducible for a given seed and chunk size.
+
+    With ``chunk_rows=None`` a single chunk holds every row.
+    """
+    regions = list(regions)
+    categories = list(categories)
+    base = base_costs or BASE_COSTS
+    base_by_code = np.array([float(base[c]) for c in categories])
+    aircraft_code = categories.index("aircraft") if "aircraft" in categories else -1
+    years_arr = np.asarray(years, dtype=np.int64)
+
+    shape = (len(years_arr), len(regions), len(categories), n_fires)
+    total = int(np.prod(shape))
+    chunk_rows = chunk_rows or max(total, 1)
+    rng = np.random.default_rng(seed)
+    noise_draw = getattr(rng, cost_noise[0])
+    hours_draw = getattr(rng, aircraft_hours[0])
+
+    for start in range(0, total, chunk_rows):
+        stop = min(start + chunk_rows, total)
+        n = stop - start
+        year_idx, region_code, category_code, fire_idx = np.unravel_index(
+            np.arange(start, stop), shape
+        )
+        cost = np.round(
+            base_by_code[category_code] * noise_draw(cost_noise[1], cost_noise[2], size=n),
+            2,
+        )
+        hours = np.where(
+            category_code == aircraft_code,
+            np.round(hours_draw(aircraft_hours[1], aircraft_hours[2], size=n), 1),
+            0.0,
+        )
+        yield {
+            "year": years_arr[year_idx],
+            "region_code": region_code,
+            "category_code": category_code,
+            "fire_idx": fire_idx,
+            "cost": cost,
+            "hours": hours,
+            "regions": regions,
+            "categories": categories,
+        }
+
+
+def generate_mock_cost_columns(**kwargs: Any) -> Dict[str, Any]:
+    """
+    Generate the whole mock dataset as one column dict.
+
+    Accepts the same keyword arguments as ``iter_mock_cost_chunks``
+    (except ``chunk_rows``).
+    """
+    return next(iter_mock_cost_chunks(**kwargs))
+
+
+def mock_columns_to_records(columns: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Expand a mock column chunk into the list-of-dicts tool format."""
+    regions = columns["regions"]
+    categories = columns["categories"]
+    return [
+        {
+            "region": regions[r],
+            "year": y,
+            "fire_id": f"{regions[r][:2].upper()}-{categories[c][:2].upper()}-{f + 1:02d}",
+            "category": categories[c],
+            "cost": cost,
+            "hours": hours,
+        }
+        for y, r, c, f, cost, hours in zip(
+            columns["year"].tolist(),
+            columns["region_code"].tolist(),
+            columns["category_code"].tolist(),
+            columns["fire_idx"].tolist(),
+            columns["cost"].tolist(),
+            columns["hours"].tolist(),
+        )
+    ]
+
+
 # ------------------------------
 # Tool 1: Load mock cost data
 # ------------------------------
@@ -23,38 +144,9 @@ def load_mock_wildfire_costs(
     """
     logger.info("Loading mock wildfire cost data for year=%s", year)
 
-    regions = ["Northwest", "Northeast", "Central", "South"]
-    categories = ["aircraft", "equipment", "personnel"]
-
-    data: List[Dict[str, Any]] = []
-    random.seed(42)
-
-    for region in regions:
-        for cat in categories:
-            # generate 3 fake fires per category-region
-            for idx in range(3):
-                base_cost = {
-                    "aircraft": 50_000,
-                    "equipment": 20_000,
-                    "personnel": 30_000,
-                }[cat]
-
-                noise_factor = random.uniform(0.7, 1.3)
-                cost = base_cost * noise_factor
-
-                hours = 0.0
-                if cat == "aircraft":
-                    hours = round(random.uniform(10, 80), 1)
-
-                row = {
-                    "region": region,
-                    "year": year,
-                    "fire_id": f"{region[:2].upper()}-{cat[:2].upper()}-{idx+1:02d}",
-                    "category": cat,
-                    "cost": round(cost, 2),
-                    "hours": hours,
-                }
-                data.append(row)
+    # 3 fake fires per category-region
+    columns = generate_mock_cost_columns(n_fires=3, years=(year,), seed=42)
+    data = mock_columns_to_records(columns)
 
     logger.info("Loaded %d mock rows for year=%s", len(data), year)
     return data
@@ -69,9 +161,25 @@ def aggregate_costs_by_region_and_category(
 ) -> List[Dict[str, Any]]:
     """
     Tool: Aggregates cost by (region, category).
+
+    Accepts dicts or any dict-like records; a ``records.CostRecordTable``
+    is aggregated straight from its columns.
     """
     logger.info("Aggregating %d records by region and category", len(records))
 
+    if isinstance(records, CostRecordTable):
+        aggregated = [
+            {
+                "region": r["region"],
+                "category": r["category"],
+                "total_cost": round(r["total_cost"], 2),
+                "total_hours": round(r["hours"], 1),
+            }
+            for r in aggregate_columns(records.columns)
+        ]
+        logger.info("Aggregation produced %d rows", len(aggregated))
+        return aggregated
+
     agg: Dict[tuple, Dict[str, Any]] = {}
 
     for row in records:
@@ -106,29 +214,31 @@ def build_cost_table_text(
 ) -> str:
     """
     Tool: Converts aggregated cost data into a simple text table.
+
+    Rows are shown by total cost, highest first. Input that is already in
+    that order (e.g. from ``aggregate_columns``) is not re-sorted; rows
+    are formatted in blocks with ``render.iter_row_blocks``.
     """
     logger.info("Building text table for %d aggregated rows", len(aggregated))
 
     if not aggregated:
         return "No data to display."
 
-    aggregated_sorted = sorted(
-        aggregated,
-        key=lambda r: r["total_cost"],
-        reverse=True,
+    costs = np.fromiter(
+        (r["total_cost"] for r in aggregated), dtype=np.float64, count=len(aggregated)
     )
+    if not (costs[:-1] >= costs[1:]).all():
+        aggregated = [aggregated[i] for i in np.argsort(-costs, kind="stable").tolist()]
 
-    lines = []
     header = f"{'Region':<12} | {'Category':<10} | {'Total Cost ($)':>14} | {'Total Hours':>11}"
     sep = "-" * len(header)
-    lines.append(header)
-    lines.append(sep)
-
-    for row in aggregated_sorted:
-        lines.append(
-            f"{row['region']:<12} | {row['category']:<10} | {row['total_cost']:>14,.2f} | {row['total_hours']:>11,.1f}"
+    table_text = header + "\n" + sep + "".join(
+        iter_row_blocks(
+            aggregated,
+            "\n{:<12} | {:<10} | {:>14,.2f} | {:>11,.1f}",
+            ("region", "category"),
+            ("total_cost", "total_hours"),
         )
-
-    table_text = "\n".join(lines)
+    )
     logger.debug("Built table text:\n%s", table_text)
     return table_text
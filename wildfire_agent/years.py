@@ -0,0 +1,162 @@
+# wildfire_agent/years.py
+"""
+Multi-year batch aggregation and year-over-year tables.
+
+Each year is aggregated independently by (region, category), so a
+20-year trend question fans out one task per year across a process
+pool and scales with cores. The per-year results are then combined
+into one year-over-year table (total, hours, change vs. prior year,
+and per-category totals).
+
+Ledger sources are either one multi-year file or a per-year path
+template containing ``{year}``, e.g. ``ledgers/costs_{year}.parquet``.
+A multi-year file is read once: either into the column cache, which the
+workers then read by year, or in one pass split by year
+(``aggregate_ledger_years``).
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from .column_cache import ColumnCache
+from .columnar import aggregate_column_batches, aggregate_columns, merge_aggregations
+from .ledger import iter_ledger_chunks, iter_ledger_year_chunks, ledger_fingerprint
+from .parallel import pool_map
+
+logger = logging.getLogger("wildfire_cost_agent")
+
+# Upper bound on years per request (keeps a mistyped range from spawning
+# hundreds of tasks).
+MAX_YEARS = 50
+
+
+def ledger_path_for_year(path: str, year: int) -> str:
+    """Resolve a ``{year}`` path template; other paths are returned as-is."""
+    return path.replace("{year}", str(year))
+
+
+def aggregate_ledger_year(
+    path: str,
+    year: int,
+    cache: Optional[ColumnCache] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Aggregate one year of a ledger by (region, category).
+
+    Top-level (picklable) so it can run in a worker process; bind `path`
+    (and `cache`) with ``functools.partial``. With a column cache the
+    year is read from the memory-mapped entry, built on first use; build
+    a shared multi-year file's entry before fanning out so workers do not
+    all parse it at once.
+    """
+    path = ledger_path_for_year(path, year)
+    if cache is None:
+        return aggregate_column_batches(iter_ledger_chunks(path, year=year))
+    cached = cache.get_or_build(ledger_fingerprint(path), path)
+    return aggregate_columns(cached.select(year))
+
+
+def aggregate_ledger_years(path: str, years: Sequence[int]) -> Dict[int, List[Dict[str, Any]]]:
+    """
+    Aggregate several years of one multi-year ledger in a single pass.
+
+    Returns {year: rows} for every requested year (empty rows for years
+    with no data).
+    """
+    partials: Dict[int, List[List[Dict[str, Any]]]] = {year: [] for year in years}
+    for year, columns in iter_ledger_year_chunks(path, years):
+        partials[year].append(aggregate_columns(columns))
+    return {year: merge_aggregations(parts) for year, parts in partials.items()}
+
+
+def aggregate_per_year(
+    years: Sequence[int],
+    aggregate_year: Callable[[int], List[Dict[str, Any]]],
+    max_workers: Optional[int] = None,
+) -> Dict[int, List[Dict[str, Any]]]:
+    """
+    Run ``aggregate_year(year)`` for every year and return {year: rows}.
+
+    With more than one year and ``max_workers`` != 1, years run in a
+    the shared ``parallel.process_pool`` (``max_workers`` defaults to the CPU count);
+    `aggregate_year` must then be picklable (a module-level function or a
+    ``functools.partial`` of one). Otherwise years run in-process.
+    """
+    years = list(years)
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = min(max_workers, len(years))
+
+    if max_workers <= 1:
+        return {year: aggregate_year(year) for year in years}
+
+    logger.info("Aggregating %d years across %d worker processes", len(years), max_workers)
+    return dict(zip(years, pool_map(aggregate_year, years, max_workers=max_workers)))
+
+
+def year_over_year(per_year: Dict[int, List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """
+    Combine per-year aggregations into one row per year, sorted by year.
+
+    Each row has year, total_cost, hours, change (vs. the previous listed
+    year, None for the first), change_pct (None when the previous total is
+    0) and ``categories`` ({category: total_cost}).
+    """
+    rows: List[Dict[str, Any]] = []
+    previous: Optional[float] = None
+    for year in sorted(per_year):
+        categories: Dict[Any, float] = {}
+        total_cost = 0.0
+        hours = 0.0
+        for r in per_year[year]:
+            cost = float(r.get("total_cost", 0.0))
+            total_cost += cost
+            hours += float(r.get("hours", 0.0))
+            categories[r.get("category")] = categories.get(r.get("category"), 0.0) + cost
+
+        change = None if previous is None else total_cost - previous
+        rows.append(
+            {
+                "year": year,
+                "total_cost": total_cost,
+                "hours": hours,
+                "change": change,
+                "change_pct": (change / previous * 100.0) if change is not None and previous else None,
+                "categories": categories,
+            }
+        )
+        previous = total_cost
+    return rows
+
+
+def render_year_over_year(rows: List[Dict[str, Any]]) -> str:
+    """Render year-over-year rows as a markdown table with a one-line trend note."""
+    if not rows:
+        return "No cost data available."
+
+    categories: List[Any] = []
+    for r in rows:
+        for c in r["categories"]:
+            if c not in categories:
+                categories.append(c)
+
+    header = ["Year", "Total Cost ($)", "Change", "Hours"] + [f"{c} ($)" for c in categories]
+    lines = [" | ".join(header), "|".join(["---"] * len(header))]
+    for r in rows:
+        change = "–" if r["change_pct"] is None else f"{r['change_pct']:+.1f}%"
+        cells = [
+            str(r["year"]),
+            f"{r['total_cost']:,.2f}",
+            change,
+            f"{r['hours']:.1f}",
+        ] + [f"{r['categories'].get(c, 0.0):,.2f}" for c in categories]
+        lines.append(" | ".join(cells))
+
+    first, last = rows[0], rows[-1]
+    note = f"Total cost went from ${first['total_cost']:,.2f} in {first['year']} to ${last['total_cost']:,.2f} in {last['year']}"
+    if first["total_cost"]:
+        note += f" ({(last['total_cost'] / first['total_cost'] - 1) * 100:+.1f}%)"
+    return "\n".join(lines) + "\n\n" + note + "."